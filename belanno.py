@@ -2,21 +2,24 @@
 
 from operator import itemgetter
 import datetime
-import urllib.request
 import os
 import argparse
 import annoheaders
-from common import get_latest_MeSH_filename
-from rdflib import Graph
-from rdflib.namespace import RDF, RDFS, OWL, DC
+from common import download, get_latest_MeSH_filename, LatestURL
+from source_cache import SourceCache
+from parsers import OwlParser
+from mesh_routing import route
 
 
 def get_data(url):
-    """ From url, get data, download and save locally. """
-    REQ = urllib.request.urlopen(url)
+    """ From url, get data, download and save locally. The file is only
+    downloaded if it changed since the last run (through the shared source
+    cache, if one is given). """
     file_name = url.split('/')[-1]
-    with open(file_name, 'b+w') as f:
-        f.write(REQ.read())
+    if cache_dir:
+        SourceCache(cache_dir).install(url, file_name, conditional=True)
+    else:
+        download(url, file_name, conditional=True)
     return file_name
 
 
@@ -47,39 +50,42 @@ def parse_owl(url, id, annotype):
     os.chdir('source-data')
     anno_dict = {}
     version = None
-    owl = Graph()
-    owl.parse(get_data(url))
-    try:
-        ontology = [s for s in owl.subjects(RDF.type, OWL.Ontology)][0]
-    except:
+    file_name = get_data(url)
+    # parsed (or loaded from the ontology cache) as in phase II of
+    # gp_baseline.py
+    owl_parser = OwlParser(file_name)
+    if cache_dir:
+        owl_parser.cache_dir = os.path.join(cache_dir, 'ontologies')
+    ontology = owl_parser.ontology()
+    header = ontology['header']
+    if header['uri'] is None:
         print("No Ontology URI for {0}".format(url))
-    ver = owl.value(ontology, OWL.versionIRI)
+    ver = header['version_iri']
     if ver:  # 1st try getting version and date from versionIRI
-        version = str(ver)
+        version = ver
         pub_date = version.split('/')[-2]
     if not version:  # 2nd try getting version from versionInfo
-        ver = owl.value(ontology, OWL.versionInfo)
+        ver = header['version_info']
         if ver:
-            version = str(ver[0])
-        pub_date = owl.value(ontology, DC.date)
+            version = ver
+        pub_date = header['date']
     if not pub_date:  # last try getting date from Ontology comments
-        for o in owl.objects(ontology, RDFS.comment):
-            if str(o).startswith('Date:'):
-                pub_date = str(o).split(':')[-1].strip()
+        for o in header['comments']:
+            if o.startswith('Date:'):
+                pub_date = o.split(':')[-1].strip()
                 pub_date = datetime.datetime.strptime(pub_date, '%dth %B %Y')
                 pub_date = pub_date.strftime('%Y-%m-%d')
 
     print(version)
     print(pub_date)
-    if id == 'EFO':  # only using cell_lines from EFO, make list of Classes
-        cell_lines = [q[0] for q in owl.query(
-            'SELECT * WHERE {?s rdfs:subClassOf+ <http://www.ebi.ac.uk/efo/EFO_0000322>}')]
-    for s in owl.subjects(RDF.type, OWL.Class):
-        val = owl.label(s)
-        term = str(s).split('/')[-1]
-        obsolete = owl.value(s, OWL.deprecated)
+    for term_dict in ontology['terms']:
+        val = term_dict['name']
+        term = term_dict['id']
+        obsolete = term_dict['is_obsolete']
         if val and term.startswith(id) and not obsolete:
-            if id == 'EFO' and s not in cell_lines:
+            # only using cell_lines from EFO
+            if id == 'EFO' and 'CellLine' not in term_dict.get(
+                    'term_type', ()):
                 continue
             else:
                 anno_dict[term] = val
@@ -112,7 +118,8 @@ def parse_mesh(mesh_url):
             elif line.startswith('*NEWRECORD'):
                 # add UI, MH, MNs to dictionaries and set to empty
                 if len(MNs) > 0:
-                    MESH_dict[UI] = {'MH': MH, 'MNs': MNs}
+                    MESH_dict[UI] = {'MH': MH, 'MNs': MNs,
+                                     'namespaces': route(UI, MNs)}
                 UI = ""
                 MH = ""
                 MNs = set()
@@ -128,20 +135,18 @@ owl_data = {
                   ('http://www.ebi.ac.uk/efo/efo.owl', 'EFO')]
 }
 
-# MeSH file is updated yearly - get latest
-mesh_url = get_latest_MeSH_filename(
+# MeSH file is updated yearly - get latest (resolved once the resource
+# directory is known, so the lookup is cached there)
+mesh_latest = LatestURL(
+    'mesh.bin',
+    get_latest_MeSH_filename,
     'ftp://nlmpubs.nlm.nih.gov/online/mesh/.asciimesh/', 'd', '.bin')
-# parse version from MeSH filename
-mesh_ver = mesh_url.split('/')[-1].lstrip('d').rstrip('.bin')
 
-# names of .belanno files from MeSH
-mesh_anno_names = ['cell-structure', 'mesh-diseases', 'mesh-anatomy']
-
-# MeSH sub-branches to imclude in mesh-anatomy
-anatomy_branches = ('A01', 'A02', 'A03', 'A04', 'A05', 'A06', 'A07', 'A08',
-                    'A09', 'A10', 'A11', 'A12', 'A14', 'A15', 'A16', 'A17')
-
-disease_branches = ('C', 'F03')
+# names of .belanno files from MeSH, and the MeSH namespace (see
+# mesh_routing.py) of their terms
+mesh_anno_names = [('cell-structure', 'meshcs'),
+                   ('mesh-diseases', 'meshd'),
+                   ('mesh-anatomy', 'mesha')]
 
 # command line argument
 parser = argparse.ArgumentParser(
@@ -152,8 +157,16 @@ parser.add_argument(
     nargs=1,
     metavar="DIRECTORY",
     help="directory for new .belanno files")
+parser.add_argument(
+    "--cache",
+    metavar="DIRECTORY",
+    help="shared cache of downloaded and parsed ontologies, as used by "
+    "gp_baseline.py --cache")
 args = parser.parse_args()
 
+# the shared cache directory is resolved before changing directory
+cache_dir = os.path.abspath(args.cache) if args.cache else None
+
 # date information for .belanno
 today = datetime.datetime.today()
 crdate = today.strftime('%Y-%m-%dT%T%Z')
@@ -166,6 +179,10 @@ if not os.path.exists(resource_dir):
     os.mkdir(resource_dir)
 os.chdir(resource_dir)
 
+mesh_url = mesh_latest.resolve()
+# parse version from MeSH filename
+mesh_ver = mesh_url.split('/')[-1].lstrip('d').rstrip('.bin')
+
 # parse data from owl files and write .belanno files
 for (name, dlist) in owl_data.items():
     anno_dict = {}
@@ -180,25 +197,10 @@ for (name, dlist) in owl_data.items():
 
 # parse MeSH information and write MeSH .belanno files
 MESH_dict = parse_mesh(mesh_url)
-for anno in mesh_anno_names:
-    anno_dict = {}
+for anno, namespace in mesh_anno_names:
     print('Generating .belanno file for {0} ...'.format(anno))
-    if anno == 'cell-structure':
-        for UI, UI_dict in MESH_dict.items():
-            if any('A11.284' in branch for branch in UI_dict['MNs']):
-                anno_dict[UI] = UI_dict['MH']
-
-    elif anno == 'mesh-diseases':
-        for UI, UI_dict in MESH_dict.items():
-            if any(branch.startswith(disease_branches)
-                   for branch in UI_dict['MNs']):
-                anno_dict[UI] = UI_dict['MH']
-
-    elif anno == 'mesh-anatomy':
-        for UI, UI_dict in MESH_dict.items():
-            if any(branch.startswith(anatomy_branches)
-                   for branch in UI_dict['MNs']):
-                anno_dict[UI] = UI_dict['MH']
+    anno_dict = {UI: UI_dict['MH'] for UI, UI_dict in MESH_dict.items()
+                 if namespace in UI_dict['namespaces']}
     annodef = annoheaders.annotation_definition(anno, version, crdate)
     citation = '[Citation]\n' + annoheaders.citation_info('MESH', mesh_ver)
     write_belanno(anno, annodef, citation, anno_dict)
@@ -0,0 +1,747 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+'''
+ benchmark.py
+
+ Times alternative code paths of the resource generator on local copies
+ of the source files, and checks that they give the same results.
+
+ commands:
+   swissprot XML DAT    SwissProtParser on uniprot_sprot.xml.gz against
+                        SwissProtDatParser on uniprot_sprot.dat.gz
+   chebi OWL            CHEBIParser on chebi.owl against the parser it
+                        replaced, which kept the whole tree in memory;
+                        each is run in a child process to report its
+                        peak RSS
+   builders             phase II record builders on synthetic records:
+                        dispatched per row by the if/elif chain they
+                        replaced (a frozen copy), looked up per row in
+                        the registry (parsed.build_data), bound once
+                        per file (parsed.get_builder) and given batches
+                        (parsed.get_batch_builder). Only the CHEBI
+                        builder is unchanged, so only its rows time the
+                        dispatch alone; the others also build records
+                        (see records.py) instead of dictionaries, keep
+                        the best gene2accession status, or route MeSH
+                        records with the trie of mesh_routing.py
+   memory               build time and size of the data objects of the
+                        builders with record types (see records.py),
+                        against the same records built by the if/elif
+                        chain as dictionaries of distinct strings, as
+                        they were: growth of the RSS (each built in a
+                        child process) and pickled size. The records
+                        trade the time spent interning their
+                        low-cardinality fields for memory: with 1M rows
+                        each on the machine they were written on, they
+                        took 25-45% less RSS and 20-40% less pickled
+                        space, and 5-20% less time to build; built by
+                        calling the record types, with the garbage
+                        collector running, they were 30-45% slower
+   store                the Entrez Gene data object kept in memory and in
+                        an SQLite store (see data_store.py): built and
+                        pickled as in phase II, then loaded and read
+                        term by term as in phases III and V, each in a
+                        child process to report its peak RSS
+
+ options:
+   -r    number of runs of each path; the fastest run is reported
+
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
+import multiprocessing
+import os
+import pickle
+import resource
+import tempfile
+import time
+import types
+from data_store import SQLiteDict
+import datasets
+import parsed
+import parsers
+from configuration import gobp_dict, gocc_dict, meshcl_dict, meshd_dict, \
+    meshpp_dict, meshc_dict, mesha_dict
+
+
+def time_parser(parser, runs):
+    """ Run parser.parse() runs times. Returns the time of the fastest run
+    and the records of the last run. """
+    best = None
+    for i in range(runs):
+        start = time.perf_counter()
+        records = list(parser.parse())
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, records
+
+
+def report(name, seconds, records):
+    print('{0:<24} {1:>9.2f} s {2:>10} records {3:>12.0f} records/s'.format(
+        name, seconds, len(records), len(records) / seconds if seconds else 0))
+
+
+def report_rss(name, seconds, rss, count):
+    print('{0:<24} {1:>9.2f} s {2:>10} records {3:>12.0f} records/s '
+          '{4:>9.1f} MB peak RSS'.format(
+              name, seconds, count, count / seconds if seconds else 0, rss))
+
+
+def peak_rss():
+    """ Return the peak RSS of this process, in MB. """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def current_rss():
+    """ Return the current RSS of this process, in MB (Linux only). """
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * resource.getpagesize() / (1 << 20)
+
+
+def canonical(value):
+    """ Return value (a record) with its dictionaries and sets sorted, so
+    records can be compared by digest. """
+    if isinstance(value, dict):
+        return sorted((k, canonical(v)) for k, v in value.items())
+    if isinstance(value, (set, frozenset)):
+        return sorted(canonical(v) for v in value)
+    return value
+
+
+def _measure(read, path):
+    # the records are not kept, so the peak RSS is that of the parser
+    digest = hashlib.sha1()
+    count = 0
+    start = time.perf_counter()
+    for record in read(path):
+        digest.update(repr(canonical(record)).encode('utf-8'))
+        count += 1
+    return time.perf_counter() - start, peak_rss(), count, digest.hexdigest()
+
+
+def measure(read, path, runs):
+    """ Run read(path) runs times, each in a new child process. Returns
+    the time of the fastest run, the highest peak RSS (MB), and the number
+    and digest of the records of the last run. """
+    best = rss = None
+    fork = multiprocessing.get_context('fork')
+    for i in range(runs):
+        with ProcessPoolExecutor(1, fork) as executor:
+            elapsed, run_rss, count, digest = executor.submit(
+                _measure, read, path).result()
+        best = elapsed if best is None else min(best, elapsed)
+        rss = run_rss if rss is None else max(rss, run_rss)
+    return best, rss, count, digest
+
+
+def chebi_before(path):
+    """ CHEBIParser as it was before elements were cleared. """
+    p = parsers.CHEBIParser(path)
+    with parsers.open_source(path) as cf:
+        tree = parsers.etree.iterparse(cf, tag=p.classy)
+        for event, elem in tree:
+            if len(elem.values()) != 0:
+                chebi_dict = {}
+                synonyms = set()
+                alt_ids = set()
+                name = ''
+                vals = elem.values()
+                chebi_dict['primary_id'] = vals[0].split('CHEBI_')[1]
+                children = elem.getchildren()
+                for child in children:
+                    if child.tag == p.label:
+                        name = child.text
+                    if child.tag == p.altId:
+                        alt_ids.add(child.text.split(':')[1])
+                    if child.tag == p.synonym:
+                        synonyms.add(child.text)
+                    chebi_dict['name'] = name
+                    chebi_dict['alt_ids'] = alt_ids
+                    chebi_dict['synonyms'] = synonyms
+
+                yield chebi_dict
+
+
+def chebi_after(path):
+    # read(), not parse(), so the ontology cache is not used
+    return parsers.CHEBIParser(path).read()
+
+
+def chebi(args):
+    print('{0:<24} {1:>9.1f} MB peak RSS'.format('(before parsing)',
+                                                 peak_rss()))
+    before_time, before_rss, count, before = measure(
+        chebi_before, args.owl, args.runs)
+    report_rss('before', before_time, before_rss, count)
+    after_time, after_rss, count, after = measure(
+        chebi_after, args.owl, args.runs)
+    report_rss('CHEBIParser', after_time, after_rss, count)
+    if before == after:
+        print('identical records')
+    else:
+        print('WARNING - records differ')
+
+
+# synthetic records of the parsers with the most rows, by parser name
+SAMPLE_RECORDS = {
+    'EntrezGeneInfo_Parser': lambda i: {
+        'tax_id': '9606', 'GeneID': str(i), 'Symbol': 'G%d' % i,
+        'Synonyms': 'S%d|T%d' % (i, i), 'dbXrefs': 'HGNC:HGNC:%d' % i,
+        'description': 'gene %d' % i, 'type_of_gene': 'protein-coding',
+        'Symbol_from_nomenclature_authority': 'G%d' % i,
+        'Full_name_from_nomenclature_authority': 'gene %d' % i,
+        'Other_designations': 'other %d' % i},
+    'Gene2Acc_Parser': lambda i: {
+        'tax_id': '9606', 'GeneID': str(i // 4),
+        'status': ('PROVISIONAL', 'REVIEWED', '-', 'VALIDATED')[i % 4]},
+    'Affy_Parser': lambda i: {
+        'Probe Set ID': '%d_at' % i, 'Entrez Gene': str(i),
+        'Species Scientific Name': 'Homo sapiens'},
+    # built as it was by the chain, so only the dispatch differs
+    'CHEBI_Parser': lambda i: {
+        'primary_id': str(i), 'name': 'chemical %d' % i,
+        'alt_ids': {str(i + 1)}, 'synonyms': {'chem %d' % i}},
+    'MESH_Parser': lambda i: {
+        'ui': 'D%06d' % i, 'mesh_header': 'heading %d' % i,
+        'mns': {'C%02d.%03d' % (i % 20, i % 1000), 'D%02d' % (i % 30)},
+        'sts': {'T047'}, 'synonyms': {'syn %d' % i}, 'rns': set()},
+}
+
+
+def build_data_before(entry, parser, data_object):
+    """ parsed.build_data as it was before the builders were registered
+    by parser name: one if/elif chain over the parser names, building a
+    dictionary per record, copied unchanged (so gene2accession rows
+    overwrite each other, and MeSH records are routed by the chain). """
+
+    if parser == 'NamespaceParser':
+        term_id = entry.get('ID')
+        data_object._dict[term_id] = {
+            'ALTIDS': entry.get('ALTIDS'),
+            'LABEL': entry.get('LABEL'),
+            'SYNONYMS': entry.get('SYNONYMS'),
+            'DESCRIPTION': entry.get('DESCRIPTION'),
+            'TYPE': entry.get('TYPE'),
+            'SPECIES': entry.get('SPECIES'),
+            'XREF': entry.get('XREF'),
+            'OBSOLETE': entry.get('OBSOLETE'),
+            'PARENTS': entry.get('PARENTS'),
+            'CHILDREN': entry.get('CHILDREN')}
+
+    if parser == 'EntrezGeneInfo_Parser':
+        gene_id = entry.get('GeneID')
+        type_of_gene = entry.get('type_of_gene')
+        description = entry.get('description')
+        tax_id = entry.get('tax_id')
+        official_symbol = entry.get('Symbol_from_nomenclature_authority')
+        synonyms = entry.get('Synonyms')
+        alternative_names = entry.get('Other_designations')
+        name = entry.get('Full_name_from_nomenclature_authority')
+        symbol = entry.get('Symbol')
+        description = entry.get('description')
+        dbXrefs = entry.get('dbXrefs')
+        data_object._dict[gene_id] = {
+            'dbXrefs': dbXrefs,
+            'type_of_gene': type_of_gene,
+            'description': description,
+            'tax_id': tax_id,
+            'Symbol_from_nomenclature_authority': official_symbol,
+            'Symbol': symbol,
+            'Synonyms': synonyms,
+            'Other_designations': alternative_names,
+            'Full_name_from_nomenclature_authority': name,
+            'description': description}
+
+    elif parser == 'EntrezGeneHistory_Parser':
+        gene_id = entry.get('GeneID')
+        discontinued_id = entry.get('Discontinued_GeneID')
+        new_id = None
+        if gene_id == '-':
+            status = 'withdrawn'
+        else:
+            status = 'retired'
+            new_id = gene_id
+
+        data_object._dict[discontinued_id] = {
+            'status': status,
+            'new_id': new_id
+        }
+
+    elif parser == 'Homologene_Parser':
+        gene_id = entry.get('GeneID')
+        tax_id = entry.get('tax_id')
+        hid = entry.get('HID')
+        # build dict to enable lookups by homologene group id OR gene ID
+        data_object._dict['gene_ids'] = data_object._dict.get('gene_ids', {})
+        data_object._dict['gene_ids'][gene_id] = {
+            'homologene_group': hid,
+            'tax_id': tax_id
+        }
+        data_object._dict['homologene_groups'] = data_object._dict.get(
+            'homologene_groups', {})
+        data_object._dict['homologene_groups'][
+            hid] = data_object._dict.get('homologene_groups').get(hid, {})
+        data_object._dict['homologene_groups'][hid][
+            tax_id] = data_object._dict.get(tax_id, set())
+        data_object._dict['homologene_groups'][hid][tax_id].add(gene_id)
+
+    elif parser == 'HGNC_Parser':
+        app_symb = entry.get('Approved Symbol')
+        loc_type = entry.get('Locus Type')
+        hgnc_id = entry.get('HGNC ID').replace('HGNC:', '')
+        old_symbols = entry.get('Previous Symbols')
+        old_names = entry.get('Previous Names')
+        synonyms = entry.get('Synonyms')
+        name_synonyms = entry.get('Name Synonyms')
+        name = entry.get('Approved Name')
+        mouse_ortholog = entry.get(
+            'Mouse Genome Database ID (supplied by MGI)')
+        rat_ortholog = entry.get('Rat Genome Database ID (supplied by RGD)')
+
+        data_object._dict[hgnc_id] = {
+            'Locus Type': loc_type,
+            'Symbol': app_symb,
+            'Previous Symbols': old_symbols,
+            'Previous Names': old_names,
+            'Synonyms': synonyms,
+            'Name Synonyms': name_synonyms,
+            'Approved Name': name,
+            'mouse_ortholog_id': mouse_ortholog,
+            'rat_ortholog_id': rat_ortholog}
+
+    elif parser == 'MGI_Parser':
+        m_symbol = entry.get('Marker Symbol')
+        feature_type = entry.get('Feature Type')
+        m_type = entry.get('Marker Type')
+        acc_id = entry.get('MGI Accession ID').replace('MGI:', '')
+        m_name = entry.get('Marker Name')
+        m_syn = entry.get('Marker Synonyms (pipe-separated)')
+
+        data_object._dict[acc_id] = {
+            'Feature Type': feature_type,
+            'Marker Type': m_type,
+            'Symbol': m_symbol,
+            'Marker Name': m_name,
+            'Marker Synonyms': m_syn}
+
+    elif parser == 'RGD_Parser':
+        gene_type = entry.get('GENE_TYPE')
+        name = entry.get('NAME')
+        symb = entry.get('SYMBOL')
+        rgd_id = entry.get('GENE_RGD_ID')
+        old_symbol = entry.get('OLD_SYMBOL')
+        old_name = entry.get('OLD_NAME')
+
+        data_object._dict[rgd_id] = {
+            'GENE_TYPE': gene_type,
+            'NAME': name,
+            'SYMBOL': symb,
+            'OLD_SYMBOL': old_symbol,
+            'OLD_NAME': old_name}
+
+    elif parser == 'SwissProt_Parser':
+        name = entry.get('name')
+        acc = entry.get('accessions')
+        primary_acc = acc[0]
+        gene_type = entry.get('type')
+        dbref = entry.get('dbreference')
+        alt_fullnames = entry.get('alternativeFullNames')
+        alt_shortnames = entry.get('alternativeShortNames')
+        rec_fullname = entry.get('recommendedFullName')
+        rec_shortname = entry.get('recommededShortName')
+        gene_name = entry.get('geneName')
+        gene_syn = entry.get('geneSynonyms')
+        tax_id = entry.get('NCBI Taxonomy')
+
+        data_object._dict[primary_acc] = {
+            'name': name,
+            'type': gene_type,
+            'accessions': acc,
+            'dbreference': dbref,
+            'alternativeFullNames': alt_fullnames,
+            'alternativeShortNames': alt_shortnames,
+            'recommendedFullName': rec_fullname,
+            'recommendedShortName': rec_shortname,
+            'geneName': gene_name,
+            'geneSynonym': gene_syn,
+            'tax_id': tax_id}
+
+    elif parser == 'Affy_Parser':
+        probe_id = entry.get('Probe Set ID')
+        entrez_gene = entry.get('Entrez Gene')
+        species = entry.get('Species Scientific Name')
+
+        data_object._dict[probe_id] = {
+            'Entrez Gene': entrez_gene,
+            'Species': species}
+
+    elif parser == 'Gene2Acc_Parser':
+        status = entry.get('status')
+        taxid = entry.get('tax_id')
+        entrez_gene = entry.get('GeneID')
+
+        data_object._dict[entrez_gene] = {
+            'status': status,
+            'tax_id': taxid,
+            'entrez_gene': entrez_gene}
+
+    elif parser == 'CHEBI_Parser':
+        name = entry.get('name')
+        primary_id = entry.get('primary_id')
+        alt_ids = entry.get('alt_ids')
+        synonyms = entry.get('synonyms')
+
+        data_object._dict[primary_id] = {
+            'name': name,
+            'alt_ids': alt_ids,
+            'synonyms': synonyms}
+
+    elif parser == 'GO_Parser':
+        termid = entry.get('termid')
+        termname = entry.get('termname')
+        alt_ids = entry.get('altids')
+        syn = entry.get('synonyms')
+        namespace = entry.get('namespace')
+        is_obsolete = entry.get('is_obsolete')
+        is_complex = entry.get('complex')
+
+        if namespace == 'cellular_component':
+            gocc_dict[termid] = {
+                'termname': termname,
+                'alt_ids': alt_ids,
+                'synonyms': syn,
+                'complex': is_complex,
+                'is_obsolete': is_obsolete}
+
+        elif namespace == 'biological_process':
+            gobp_dict[termid] = {
+                'termname': termname,
+                'alt_ids': alt_ids,
+                'synonyms': syn,
+                'is_obsolete': is_obsolete}
+
+    elif parser == 'MESH_Parser':
+        ui = entry.get('ui')
+        mh = entry.get('mesh_header')
+        mns = entry.get('mns')
+        sts = entry.get('sts')
+        synonyms = entry.get('synonyms')
+
+        mesh_dict = {}
+        mesh_dict['mesh_header'] = mh
+        mesh_dict['synonyms'] = synonyms
+
+        if any(branch.startswith('A11.284') for branch in mns):
+            meshcl_dict[ui] = mesh_dict
+
+        disease_branches = ('C', 'F03')
+        if any(branch.startswith(disease_branches) for branch in mns):
+            meshd_dict[ui] = mesh_dict
+
+        if any(branch.startswith('G') for branch in mns):
+            branches = {branch for branch in mns if branch.startswith('G')}
+            excluded = ('G01', 'G15', 'G17')
+            if not all(branch.startswith(excluded) for branch in branches):
+                meshpp_dict[ui] = mesh_dict
+
+        if any(branch.startswith('D') for branch in mns) or ui.startswith('C'):
+            # filter by semantic type for chemicals, but allow all non-typed terms in
+            # see http://semanticnetwork.nlm.nih.gov/SemGroups/SemGroups.txt
+            chemicals = (
+                'T116',
+                'T195',
+                'T123',
+                'T122',
+                'T118',
+                'T103',
+                'T120',
+                'T104',
+                'T200',
+                'T111',
+                'T196',
+                'T126',
+                'T131',
+                'T125',
+                'T129',
+                'T130',
+                'T197',
+                'T119',
+                'T124',
+                'T114',
+                'T109',
+                'T115',
+                'T121',
+                'T192',
+                'T110',
+                'T127')
+
+            if ui.startswith('D') or any(
+                    st in chemicals for st in sts) or len(sts) == 0:
+                meshc_dict[ui] = mesh_dict
+
+        if any(branch.startswith('A') for branch in mns):
+            excluded = ('A13', 'A18', 'A19', 'A20', 'A21')
+            branches = {branch for branch in mns if branch.startswith('A')}
+            if not all(branch.startswith(excluded) for branch in branches):
+                mesha_dict[ui] = mesh_dict
+
+    elif parser == 'SwissWithdrawn_Parser':
+        term_id = entry.get('accession')
+
+        data_object._dict[term_id] = {
+            'status': 'withdrawn'
+        }
+
+    elif str(parser) == 'DO_Parser':
+        name = entry.get('name')
+        term_id = entry.get('id')
+        dbxrefs = entry.get('dbxrefs')
+        synonyms = entry.get('synonyms')
+        data_object._dict[term_id] = {
+            'name': name,
+            'dbxrefs': dbxrefs,
+            'synonyms': synonyms,
+            'alt_ids': entry.get('alt_ids'),
+            'is_obsolete': entry.get('is_obsolete')}
+
+    elif parser == 'Owl_Parser':
+        term_id = entry.get('id')
+        prefix = data_object._prefix.upper()
+        term_type = entry.get('term_type')
+        if prefix == 'EFO' and term_type is None:
+            pass
+        elif term_id.startswith(prefix):
+            term_id = term_id.lstrip(prefix + '_')
+            term_id = term_id.lstrip(prefix + 'ID_')
+            data_object._dict[term_id] = {
+                'name': entry.get('name'),
+                'dbxrefs': entry.get('dbxrefs'),
+                'synonyms': entry.get('synonyms'),
+                'alt_ids': entry.get('alt_ids'),
+                'is_obsolete': entry.get('is_obsolete')}
+            if term_type:
+                data_object._dict[term_id]['term_type'] = term_type
+
+    elif parser == 'RGDOrthologParser':
+        term_id = entry.get('RAT_GENE_RGD_ID')
+        data_object._dict[term_id] = {
+            'symbol': entry.get('RAT_GENE_SYMBOL'),
+            'human_ortholog_id': entry.get('HUMAN_ORTHOLOG_HGNC_ID'),
+            'mouse_ortholog_id': entry.get('MOUSE_ORTHOLOG_MGI')}
+
+    elif parser == 'RGD_Obsolete_Parser':
+        term_id = entry.get('OLD_GENE_RGD_ID')
+        data_object._dict[term_id] = {
+            'status': entry.get('OLD_GENE_STATUS').lower(),
+            'new_id': entry.get('NEW_GENE_RGD_ID'),
+            'type': entry.get('OLD_GENE_TYPE')	}
+
+    elif parser == 'NCBI_Taxonomy_Parser':
+        term_id = entry.get('term_id')
+        data_object._dict[term_id] = {
+            'name': entry.get('name'),
+            'synonyms': entry.get('synonyms')}
+
+
+def builders(args):
+    for name, sample in SAMPLE_RECORDS.items():
+        records = [sample(i) for i in range(args.rows)]
+
+        def chain(data_object):
+            for record in records:
+                build_data_before(record, name, data_object)
+
+        def registry(data_object):
+            for record in records:
+                parsed.build_data(record, name, data_object)
+
+        def bound(data_object):
+            build = parsed.get_builder(name)
+            for record in records:
+                build(record, data_object)
+
+        def batches(data_object):
+            size = parsers.Parser.batch_size
+            parsed.build_batches(
+                parsed.get_batch_builder(name),
+                (records[i:i + size] for i in range(0, len(records), size)),
+                data_object)
+
+        for label, run in (('chain', chain), ('registry', registry),
+                           ('bound', bound), ('batches', batches)):
+            best = None
+            for i in range(args.runs):
+                data_object = types.SimpleNamespace(_dict={}, _prefix='')
+                start = time.perf_counter()
+                run(data_object)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            report('{0} {1}'.format(name.replace('_Parser', ''), label),
+                   best, records)
+
+
+def fresh(value):
+    """ Return a copy of the string value that is a separate object, as
+    each value read from a source file is. """
+    return (value + ' ')[:-1] if isinstance(value, str) else value
+
+
+def _dataset_size(name, rows, as_dicts):
+    # the data object is built from fresh strings, a batch at a time, as
+    # parse_file builds it: into dictionaries by the if/elif chain, as it
+    # was, or into records by the batch builder
+    build = parsed.get_batch_builder(name)
+    sample = SAMPLE_RECORDS[name]
+    size = parsers.Parser.batch_size
+    data_object = types.SimpleNamespace(_dict={}, _prefix='')
+    elapsed = 0
+    start = current_rss()
+    for i in range(0, rows, size):
+        batch = [dict((k, fresh(v)) for k, v in sample(j).items())
+                 for j in range(i, min(rows, i + size))]
+        begin = time.perf_counter()
+        if as_dicts:
+            for entry in batch:
+                build_data_before(entry, name, data_object)
+        else:
+            parsed.build_batches(build, [batch], data_object)
+        elapsed += time.perf_counter() - begin
+    rss = current_rss() - start
+    pickled = len(pickle.dumps(data_object._dict, pickle.HIGHEST_PROTOCOL))
+    return len(data_object._dict), elapsed, rss, pickled / (1 << 20)
+
+
+def memory(args):
+    fork = multiprocessing.get_context('fork')
+    for name in ('EntrezGeneInfo_Parser', 'Gene2Acc_Parser', 'Affy_Parser'):
+        for label, as_dicts in (('dicts', True), ('records', False)):
+            with ProcessPoolExecutor(1, fork) as executor:
+                count, elapsed, rss, pickled = executor.submit(
+                    _dataset_size, name, args.rows, as_dicts).result()
+            print('{0:<24} {1:>10} records {2:>9.2f} s {3:>9.1f} MB RSS '
+                  '{4:>9.1f} MB pickled'.format('{0} {1}'.format(
+                      name.replace('_Parser', ''), label), count, elapsed,
+                      rss, pickled))
+
+
+def _store_build(rows, path, store, cache_size):
+    # phase II: built a batch at a time, then pickled
+    data_object = datasets.EntrezInfoData({})
+    if store:
+        data_object._dict = SQLiteDict(store, cache_size)
+    build = parsed.get_batch_builder('EntrezGeneInfo_Parser')
+    sample = SAMPLE_RECORDS['EntrezGeneInfo_Parser']
+    size = parsers.Parser.batch_size
+    start = time.perf_counter()
+    for i in range(0, rows, size):
+        build([sample(j) for j in range(i, min(rows, i + size))], data_object)
+    with open(path, 'wb') as f:
+        pickle.dump(data_object, f, pickle.HIGHEST_PROTOCOL)
+    return time.perf_counter() - start, peak_rss()
+
+
+def _store_read(path):
+    # phases III and V: loaded, then read term by term
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        data_object = pickle.load(f)
+    digest = hashlib.sha1()
+    count = 0
+    for term_id in data_object.get_values():
+        digest.update(repr((
+            term_id, data_object.get_label(term_id),
+            data_object.get_species(term_id),
+            sorted(data_object.get_alt_symbols(term_id)))).encode('utf-8'))
+        count += 1
+    return (time.perf_counter() - start, peak_rss(), count,
+            digest.hexdigest())
+
+
+def store(args):
+    fork = multiprocessing.get_context('fork')
+    digests = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, db in (('in memory', None),
+                          ('store', os.path.join(tmp, 'egid.sqlite'))):
+            path = os.path.join(tmp, label.replace(' ', '-') + '.pickle')
+            with ProcessPoolExecutor(1, fork) as executor:
+                elapsed, rss = executor.submit(
+                    _store_build, args.rows, path, db,
+                    args.cache_size).result()
+            print('{0:<24} {1:>9.2f} s {2:>9.1f} MB peak RSS {3:>9.1f} MB '
+                  'pickled'.format('build ' + label, elapsed, rss,
+                                   os.path.getsize(path) / (1 << 20)))
+            with ProcessPoolExecutor(1, fork) as executor:
+                elapsed, rss, count, digest = executor.submit(
+                    _store_read, path).result()
+            report_rss('read ' + label, elapsed, rss, count)
+            digests.append(digest)
+    if digests[0] == digests[1]:
+        print('identical values')
+    else:
+        print('WARNING - values differ')
+
+
+def swissprot(args):
+    xml_parser = parsers.SwissProtParser(args.xml)
+    xml_parser.workers = args.workers
+    dat_parser = parsers.SwissProtDatParser(args.dat)
+    xml_time, xml_records = time_parser(xml_parser, args.runs)
+    report('SwissProtParser', xml_time, xml_records)
+    dat_time, dat_records = time_parser(dat_parser, args.runs)
+    report('SwissProtDatParser', dat_time, dat_records)
+    if xml_records == dat_records:
+        print('identical records; flat file {0:.1f}x faster'.format(
+            xml_time / dat_time))
+    else:
+        xml_acc = set(r['accessions'][0] for r in xml_records)
+        dat_acc = set(r['accessions'][0] for r in dat_records)
+        print('WARNING - records differ: {0} only in XML, {1} only in flat '
+              'file'.format(len(xml_acc - dat_acc), len(dat_acc - xml_acc)))
+
+
+parser = argparse.ArgumentParser(
+    description="""Benchmark alternative parsing paths.""")
+parser.add_argument("-r", "--runs", type=int, default=1,
+                    help="number of runs of each path")
+commands = parser.add_subparsers(dest='command')
+sp = commands.add_parser(
+    'swissprot', help="compare the Swiss-Prot XML and flat file parsers")
+sp.add_argument('xml', help="uniprot_sprot.xml(.gz)")
+sp.add_argument('dat', help="uniprot_sprot.dat(.gz)")
+sp.add_argument("-w", "--workers", type=int, default=1,
+                help="worker processes for the XML parser")
+sp.set_defaults(run=swissprot)
+ch = commands.add_parser(
+    'chebi', help="compare CHEBIParser with the parser it replaced")
+ch.add_argument('owl', help="chebi.owl(.gz)")
+ch.set_defaults(run=chebi)
+bu = commands.add_parser(
+    'builders', help="time the phase II record builders")
+bu.add_argument("-n", "--rows", type=int, default=200000,
+                help="number of records per parser")
+bu.set_defaults(run=builders)
+me = commands.add_parser(
+    'memory', help="compare the size of dictionary and record data objects")
+me.add_argument("-n", "--rows", type=int, default=1000000,
+                help="number of records per parser")
+me.set_defaults(run=memory)
+st = commands.add_parser(
+    'store', help="compare data objects in memory and in an SQLite store")
+st.add_argument("-n", "--rows", type=int, default=1000000,
+                help="number of Entrez Gene records")
+st.add_argument("-c", "--cache-size", type=int,
+                default=parsed.store_cache_size,
+                help="number of values the store keeps in memory")
+st.set_defaults(run=store)
+args = parser.parse_args()
+
+if args.command is None:
+    parser.print_help()
+else:
+    args.run(args)
@@ -10,73 +10,637 @@
 
 '''
 
-from ftplib import FTP
+from collections import defaultdict
+from ftplib import FTP, error_perm
 from lxml import etree
+import atexit
+import bz2
+import contextlib
+import ftplib
 import gzip
+import http.client
+import io
+import json
+import lzma
 import os
 import re
 import shutil
+import threading
 import time
+import urllib.error
 import urllib.parse
 import urllib.request
+import zipfile
+import zlib
 
 
-def download(url, fileName=None):
-    def getFileName(url, openUrl):
-        if 'Content-Disposition' in openUrl.info():
-            # If the response has Content-Disposition, try to get filename from
-            # it
-            cd = dict(map(
-                lambda x: x.strip().split('=') if '=' in x else (x.strip(), ''),
-                openUrl.info()['Content-Disposition'].split(';')))
-            if 'filename' in cd:
-                filename = cd['filename'].strip("\"'")
-                if filename:
-                    return filename
-        # if no filename was found above, parse it out of the final URL.
-        return os.path.basename(urllib.parse.urlsplit(openUrl.url)[2])
-
-    if url.startswith("ftp://"):
-        urltokens = urllib.parse.urlsplit(url)
-        ftp = FTP(urltokens.netloc)
+def read_info(fileName):
+    """ Return the fields recorded in the .info file written by download()
+    for fileName, as a dictionary (empty if there is no .info file). """
+    info = {}
+    try:
+        with open(fileName + '.info') as f:
+            for line in f:
+                if ': ' in line:
+                    key, value = line.rstrip('\n').split(': ', 1)
+                    info[key] = value
+    except OSError:
+        pass
+    return info
+
+
+def write_info(fileName, url, last_modified=None, etag=None, size=None):
+    """ Write the .info file that records where and when fileName was
+    downloaded, and the upstream validators used by conditional downloads. """
+    with open(fileName + '.info', 'w') as info:
+        info.write("URL: " + url + "\n")
+        info.write("Filename: " + fileName + "\n")
+        if last_modified:
+            info.write("Last modified: " + last_modified + "\n")
+        if etag:
+            info.write("ETag: " + etag + "\n")
+        if size is not None:
+            info.write("Size: " + str(size) + "\n")
+        info.write(
+            "Downloaded at: " +
+            time.strftime("%Y-%m-%d %H:%M:%S") +
+            "\n")
+
+
+def is_unchanged(fileName, url, last_modified=None, etag=None, size=None):
+    """ True if the local copy of fileName was downloaded from url and the
+    upstream validators (ETag, last modified time, size) still match the
+    ones recorded in its .info file. """
+    info = read_info(fileName)
+    if info.get('URL') != url or not os.path.exists(fileName):
+        return False
+    if etag and info.get('ETag'):
+        matched = etag == info.get('ETag')
+    elif last_modified and info.get('Last modified'):
+        matched = last_modified == info.get('Last modified')
+    else:
+        return False
+    if size is not None and str(size) != info.get('Size', str(size)):
+        return False
+    if size is not None and os.path.getsize(fileName) != int(size):
+        return False
+    return matched
+
+
+class IntegrityError(Exception):
+
+    ''' Raised when a downloaded file fails its integrity check. '''
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return repr(self.value)
+
+
+def sniff_format(head):
+    """ Identify the container format of a file from its first bytes:
+    'gzip', 'zip', 'bz2', 'xz', 'xml' or 'plain'. """
+    if head.startswith(b'\x1f\x8b'):
+        return 'gzip'
+    if head.startswith((b'PK\x03\x04', b'PK\x05\x06')):
+        return 'zip'
+    if head.startswith(b'BZh'):
+        return 'bz2'
+    if head.startswith(b'\xfd7zXZ\x00'):
+        return 'xz'
+    if head.lstrip(b'\xef\xbb\xbf \t\r\n').startswith(b'<'):
+        return 'xml'
+    return 'plain'
+
+
+class _NullTarget(object):
+
+    ''' lxml parser target that discards the document; used to check that
+    a stream is well-formed XML without building a tree. '''
+
+    def close(self):
+        return None
+
+
+class StreamVerifier(object):
+
+    ''' Checks the integrity of a file while its bytes arrive. The format
+    is sniffed from the first bytes: gzip streams are decompressed to check
+    the CRC and length of every member, zip archives get their central
+    directory checked once complete, and XML (plain or gzipped) is fed to a
+    non-tree-building parser to check that it is well-formed. '''
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.format = None
+        self.inner = None
+        self.xml = None
+        self.gzip = None
+
+    def feed(self, data):
+        if self.format is None:
+            self.format = sniff_format(data)
+            if self.format == 'gzip':
+                self.gzip = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            elif self.format == 'xml':
+                self.xml = etree.XMLParser(target=_NullTarget(),
+                                           huge_tree=True)
+        try:
+            if self.gzip is not None:
+                self._feed_gzip(data)
+            elif self.xml is not None:
+                self.xml.feed(data)
+        except (zlib.error, etree.XMLSyntaxError) as e:
+            raise IntegrityError('{0}: {1}'.format(self.fileName, e))
+
+    def _feed_gzip(self, data):
+        while data:
+            if self.gzip.eof:
+                # start of the next member of a multi-member gzip file;
+                # trailing zero padding is allowed
+                if not data.strip(b'\x00'):
+                    return
+                self.gzip = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            out = self.gzip.decompress(data)
+            data = self.gzip.unused_data
+            if out:
+                if self.inner is None:
+                    self.inner = sniff_format(out)
+                    if self.inner == 'xml':
+                        self.xml = etree.XMLParser(target=_NullTarget(),
+                                                   huge_tree=True)
+                if self.xml is not None:
+                    self.xml.feed(out)
+
+    def close(self):
+        """ Finish the check; raises IntegrityError if the file is
+        truncated or corrupt. """
+        try:
+            if self.gzip is not None and not self.gzip.eof:
+                raise IntegrityError(
+                    '{0}: truncated gzip stream'.format(self.fileName))
+            if self.xml is not None:
+                self.xml.close()
+            if self.format == 'zip':
+                with zipfile.ZipFile(self.fileName) as z:
+                    size = os.path.getsize(self.fileName)
+                    for zinfo in z.infolist():
+                        if zinfo.header_offset + zinfo.compress_size > size:
+                            raise IntegrityError('{0}: truncated member {1}'.format(
+                                self.fileName, zinfo.filename))
+        except (etree.XMLSyntaxError, zipfile.BadZipFile) as e:
+            raise IntegrityError('{0}: {1}'.format(self.fileName, e))
+
+
+class PartialDownload(object):
+
+    ''' A download in progress, written to <fileName>.part. A journal
+    (<fileName>.part.info) records the URL and upstream validators so that
+    an interrupted transfer can be resumed as long as the upstream file is
+    unchanged. '''
+
+    def __init__(self, fileName, url):
+        self.fileName = fileName
+        self.url = url
+        self.part = fileName + '.part'
+        self.journal = read_info(self.part)
+        self.offset = 0
+        self.f = None
+        if self.journal.get('URL') == url and os.path.exists(self.part):
+            self.offset = os.path.getsize(self.part)
+
+    def resumable(self, last_modified=None, etag=None, size=None):
+        """ True if the partial file can be resumed given the current
+        upstream validators. """
+        if not self.offset:
+            return False
+        if etag and self.journal.get('ETag') != etag:
+            return False
+        if last_modified and self.journal.get('Last modified') != last_modified:
+            return False
+        if not etag and not last_modified:
+            return False
+        return size is None or self.offset <= int(size)
+
+    def begin(self, resume, last_modified=None, etag=None, size=None):
+        """ Open the partial file for writing, appending to it if resume is
+        True, and record the validators in the journal. """
+        self.validators = (last_modified, etag, size)
+        if not resume:
+            self.offset = 0
+        write_info(self.part, self.url, last_modified, etag, size)
+        self.verifier = StreamVerifier(self.part)
+        if self.offset:
+            # bring the verifier up to date with the bytes already on disk
+            with open(self.part, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    self.verify(block)
+        self.f = open(self.part, 'ab' if self.offset else 'wb')
+
+    def write(self, data):
+        self.f.write(data)
+        self.verify(data)
+        self.offset += len(data)
+
+    def verify(self, data):
+        """ Feed data to the verifier. A corrupt partial file is removed,
+        with its journal, so that it is never resumed. """
+        try:
+            self.verifier.feed(data)
+        except IntegrityError:
+            self.close()
+            self.discard()
+            raise
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+
+    def finish(self):
+        """ Verify the completed file, move it into place and write its
+        .info file. A corrupt file is removed so the next attempt starts
+        from scratch. """
+        self.close()
+        try:
+            last_modified, etag, size = self.validators
+            if size is not None and self.offset != int(size):
+                raise IntegrityError('{0}: expected {1} bytes, got {2}'.format(
+                    self.part, size, self.offset))
+            self.verifier.close()
+        except IntegrityError:
+            self.discard()
+            raise
+        os.replace(self.part, self.fileName)
+        os.remove(self.part + '.info')
+        write_info(self.fileName, self.url, last_modified, etag, size)
+
+    def discard(self):
+        for fn in (self.part, self.part + '.info'):
+            if os.path.exists(fn):
+                os.remove(fn)
+
+
+class FTPPool(object):
+
+    ''' Pool of logged-in FTP control connections, kept per host so that
+    several files (and their MDTM/SIZE probes) from the same server reuse
+    one session. A session is used by one thread at a time; it is returned
+    to the pool after use, or closed if an error left it in an unknown
+    state. '''
+
+    def __init__(self):
+        self._idle = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def _acquire(self, host):
+        while True:
+            with self._lock:
+                if not self._idle[host]:
+                    break
+                ftp = self._idle[host].pop()
+            try:
+                # the server may have dropped an idle session
+                ftp.voidcmd('NOOP')
+                return ftp
+            except ftplib.all_errors:
+                ftp.close()
+        hostname, sep, port = host.partition(':')
+        ftp = FTP()
+        ftp.connect(hostname, int(port or 21))
         ftp.login()
-        moddt = ftp.sendcmd("MDTM " + urltokens.path)
-        if fileName is None:
-            fileName = os.path.basename(urltokens.path)
-        with open(fileName, "wb") as ftpf, open(fileName + ".info", 'w') as info:
-            ftp.retrbinary("RETR " + urltokens.path, ftpf.write)
-            info.write("URL: " + url + "\n")
-            info.write("Filename: " + fileName + "\n")
-            info.write("Last modified: " + moddt.split(" ")[1] + "\n")
-            info.write(
-                "Downloaded at: " +
-                time.strftime("%Y-%m-%d %H:%M:%S") +
-                "\n")
+        return ftp
+
+    @contextlib.contextmanager
+    def session(self, host):
+        """ Context manager yielding a logged-in FTP session for host. """
+        ftp = self._acquire(host)
+        try:
+            yield ftp
+        except BaseException:
+            ftp.close()
+            raise
+        with self._lock:
+            self._idle[host].append(ftp)
+
+    def close(self):
+        """ Log out of and close every idle session. """
+        with self._lock:
+            sessions = [ftp for idle in self._idle.values() for ftp in idle]
+            self._idle.clear()
+        for ftp in sessions:
+            try:
+                ftp.quit()
+            except ftplib.all_errors:
+                ftp.close()
+
+
+ftp_pool = FTPPool()
+atexit.register(ftp_pool.close)
+
+
+def _download_ftp(url, fileName, conditional):
+    urltokens = urllib.parse.urlsplit(url)
+    with ftp_pool.session(urltokens.netloc) as ftp:
+        moddt = ftp.sendcmd("MDTM " + urltokens.path).split(" ")[1]
+        try:
+            ftp.voidcmd("TYPE I")
+            size = ftp.size(urltokens.path)
+        except error_perm:
+            # SIZE is not supported by every server
+            size = None
+        if conditional and is_unchanged(fileName, url, moddt, size=size):
+            return False
+        part = PartialDownload(fileName, url)
+        resume = part.resumable(moddt, size=size)
+        part.begin(resume, moddt, size=size)
+        try:
+            if size is None or part.offset < size:
+                ftp.retrbinary("RETR " + urltokens.path, part.write,
+                               rest=part.offset or None)
+            if size is not None and part.offset < size:
+                # the transfer ended early; the partial file is resumed
+                raise EOFError('{0}: expected {1} bytes, got {2}'.format(
+                    part.part, size, part.offset))
+        finally:
+            part.close()
+    part.finish()
+    return True
+
+
+def _download_http(url, fileName, conditional):
+    request = urllib.request.Request(url)
+    part = None
+    if fileName:
+        info = read_info(fileName) if conditional else {}
+        if info.get('URL') == url and os.path.exists(fileName):
+            if 'Last modified' in info:
+                request.add_header('If-Modified-Since', info['Last modified'])
+            if 'ETag' in info:
+                request.add_header('If-None-Match', info['ETag'])
+        part = PartialDownload(fileName, url)
+        validator = part.journal.get('ETag', part.journal.get('Last modified'))
+        if part.offset and validator:
+            request.add_header('Range', 'bytes={0}-'.format(part.offset))
+            request.add_header('If-Range', validator)
+    try:
+        r = urllib.request.urlopen(request)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return False
+        if e.code == 416:
+            # the partial file is already complete (or longer than the
+            # upstream file); let a fresh request decide
+            if part is not None:
+                part.discard()
+                return _download_http(url, fileName, conditional)
+        raise
+    with r:
+        fileName = fileName or getFileName(url, r)
+        headers = r.info()
+        last_modified = headers.get('Last-Modified')
+        if last_modified:
+            last_modified = last_modified.strip("\"'")
+        etag = headers.get('ETag')
+        size = headers.get('Content-Length')
+        # only a request for the rest of a partial file gets a 206
+        resume = part is not None and r.status == 206
+        if resume:
+            # validators and size of the whole file come from the journal
+            last_modified = part.journal.get('Last modified')
+            etag = part.journal.get('ETag')
+            size = part.journal.get('Size')
+        elif conditional and is_unchanged(
+                fileName, url, last_modified, etag, size):
+            # servers (and file: URLs) that ignore conditional headers
+            return False
+        else:
+            part = PartialDownload(fileName, url)
+        part.begin(resume, last_modified, etag, size)
+        try:
+            for block in iter(lambda: r.read(1 << 16), b''):
+                part.write(block)
+            if size is not None and part.offset < int(size):
+                # the server closed the connection early, without an error;
+                # the partial file is resumed like any interrupted transfer
+                raise http.client.IncompleteRead(
+                    b'', int(size) - part.offset)
+        finally:
+            part.close()
+    part.finish()
+    return True
+
+
+def getFileName(url, openUrl):
+    if 'Content-Disposition' in openUrl.info():
+        # If the response has Content-Disposition, try to get filename from
+        # it
+        cd = dict(map(
+            lambda x: x.strip().split('=') if '=' in x else (x.strip(), ''),
+            openUrl.info()['Content-Disposition'].split(';')))
+        if 'filename' in cd:
+            filename = cd['filename'].strip("\"'")
+            if filename:
+                return filename
+    # if no filename was found above, parse it out of the final URL.
+    return os.path.basename(urllib.parse.urlsplit(openUrl.url)[2])
+
+
+# seconds to wait before the first retry of a download, doubled for each
+# retry after it
+retry_delay = 2
+
+
+def download(url, fileName=None, conditional=False, attempts=3):
+    """ Download url to fileName and record the source in fileName.info.
+    If conditional is True, the download is skipped when the upstream file
+    has not changed since the last download (see is_unchanged). Transfers
+    that are interrupted are resumed (FTP REST, HTTP Range) up to attempts
+    times, after a growing delay (see retry_delay), and the file is
+    checked while it arrives (see StreamVerifier); a corrupt file is
+    discarded and downloaded again from scratch, and raises IntegrityError
+    if the last attempt is corrupt too. Errors that another attempt cannot
+    fix (an HTTP 4xx status, an FTP 5xx reply such as 550 for a missing
+    file) are raised at once. Returns True if the file was downloaded,
+    False if it was unchanged. """
+    if fileName is None and url.startswith("ftp://"):
+        fileName = os.path.basename(urllib.parse.urlsplit(url).path)
+    for attempt in range(1, attempts + 1):
+        try:
+            if url.startswith("ftp://"):
+                return _download_ftp(url, fileName, conditional)
+            else:
+                return _download_http(url, fileName, conditional)
+        except IntegrityError as e:
+            # the corrupt partial file has been discarded
+            if attempt == attempts:
+                raise
+            print('WARNING - download of {0} is corrupt ({1}); '
+                  'downloading again'.format(url, e))
+        except urllib.error.HTTPError as e:
+            if e.code < 500 or attempt == attempts:
+                raise
+            print('WARNING - download of {0} failed ({1}); retrying'.format(
+                url, e))
+        except error_perm:
+            raise
+        except (OSError, EOFError, ftplib.Error,
+                http.client.HTTPException) as e:
+            if attempt == attempts:
+                raise
+            print('WARNING - download of {0} interrupted ({1}); resuming'.format(
+                url, e))
+        time.sleep(retry_delay * 2 ** (attempt - 1))
+
+
+def download_all(downloads, workers=8, per_host=2, verbose=False,
+                 conditional=False, fetch=download):
+    """ Download each (url, fileName) pair in downloads using a pool of
+    worker threads, with at most per_host concurrent connections to any
+    one host. Downloads are started in the order given, so callers should
+    list the largest files first. If conditional is True, files that have
+    not changed upstream are skipped (see download). fetch is called as
+    fetch(url, fileName, conditional) for each download and may be
+    replaced, e.g. by SourceCache.install. Returns a list of the
+    (url, fileName) pairs that were downloaded and a list of
+    (url, fileName, error) tuples for the downloads that failed. """
+    pending = list(downloads)
+    active = defaultdict(int)
+    updated = []
+    failures = []
+    cond = threading.Condition()
+
+    def next_download():
+        # take the first pending download whose host has a free connection
+        with cond:
+            while pending:
+                for i, (url, fileName) in enumerate(pending):
+                    host = urllib.parse.urlsplit(url).netloc
+                    if active[host] < per_host:
+                        active[host] += 1
+                        return pending.pop(i)
+                cond.wait()
+            return None
+
+    def worker():
+        while True:
+            job = next_download()
+            if job is None:
+                return
+            url, fileName = job
+            host = urllib.parse.urlsplit(url).netloc
+            try:
+                if verbose:
+                    print('Downloading ' + fileName)
+                if fetch(url, fileName, conditional):
+                    print(url)
+                    with cond:
+                        updated.append((url, fileName))
+                elif verbose:
+                    print('Unchanged ' + url)
+            except Exception as e:
+                with cond:
+                    failures.append((url, fileName, e))
+            finally:
+                with cond:
+                    active[host] -= 1
+                    cond.notify_all()
+
+    threads = [threading.Thread(target=worker)
+               for i in range(min(workers, len(pending)))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return updated, failures
+
+
+def open_source(path, encoding=None):
+    """ Open a source file for streaming, whatever its container format.
+    The format is sniffed from the magic bytes (see sniff_format), so gzip,
+    bz2 and xz files and zip archives (first member) are decompressed
+    transparently. Returns a binary stream, or a text stream decoded with
+    encoding if one is given. """
+    with open(path, 'rb') as f:
+        head = f.read(8)
+    fmt = sniff_format(head)
+    if fmt == 'gzip':
+        stream = gzip.open(path, 'rb')
+    elif fmt == 'bz2':
+        stream = bz2.open(path, 'rb')
+    elif fmt == 'xz':
+        stream = lzma.open(path, 'rb')
+    elif fmt == 'zip':
+        with zipfile.ZipFile(path) as z:
+            # the member stays readable after the archive is closed
+            name = [n for n in z.namelist() if not n.endswith('/')][0]
+            stream = z.open(name)
     else:
-        with urllib.request.urlopen(url) as r, open(fileName, 'wb') as f, open(fileName + ".info", 'w') as info:
-            fileName = fileName or getFileName(url, r)
-            shutil.copyfileobj(r, f)
-            info.write("URL: " + url + "\n")
-            info.write("Filename: " + fileName + "\n")
-            if 'Last-Modified' in r.info():
-                info.write(
-                    "Last modified: " +
-                    r.info()['Last-Modified'].strip("\"'") +
-                    "\n")
-            info.write(
-                "Downloaded at: " +
-                time.strftime("%Y-%m-%d %H:%M:%S") +
-                "\n")
+        stream = open(path, 'rb')
+    if encoding is None:
+        return stream
+    return io.TextIOWrapper(stream, encoding=encoding)
 
 
 def gzip_to_text(gzip_file, encoding="iso-8859-1"):
-    with gzip.open(gzip_file) as gzf:
-        for line in gzf:
-            yield str(line, encoding)
+    with open_source(gzip_file, encoding) as f:
+        for line in f:
+            yield line
+
+
+def read_ncbi_tsv(path, fieldnames, tax_ids, encoding='iso-8859-1',
+                  block_size=1 << 22):
+    """ Yield the rows of an NCBI tab-separated file (gene_info,
+    gene_history, gene2accession) whose first column, the tax_id, is one
+    of tax_ids, as dictionaries keyed by fieldnames (like csv.DictReader).
+    See read_ncbi_tsv_batches. """
+    for batch in read_ncbi_tsv_batches(path, fieldnames, tax_ids, encoding,
+                                       block_size):
+        yield from batch
+
+
+def read_ncbi_tsv_batches(path, fieldnames, tax_ids, encoding='iso-8859-1',
+                          block_size=1 << 22):
+    """ Yield the rows read_ncbi_tsv yields as one list per block of the
+    file. The file is decompressed in large blocks and rows are selected
+    on their leading tax_id bytes, so only the rows kept are decoded and
+    split. Fields are split on tabs only; NCBI files do not quote. """
+    pattern = re.compile(
+        b'^(?:' + b'|'.join(re.escape(t.encode('ascii')) for t in tax_ids) +
+        b')\t[^\n]*', re.MULTILINE)
+    n = len(fieldnames)
+    rest = b''
+    with open_source(path) as f:
+        while True:
+            block = f.read(block_size)
+            if block:
+                end = block.rfind(b'\n') + 1
+                if not end:
+                    rest += block
+                    continue
+                data = rest + block[:end]
+                rest = block[end:]
+            elif rest:
+                data, rest = rest, b''
+            else:
+                break
+            batch = []
+            for m in pattern.finditer(data):
+                values = m.group().decode(encoding).rstrip('\r').split('\t')
+                row = dict(zip(fieldnames, values))
+                if len(values) > n:
+                    row[None] = values[n:]
+                elif len(values) < n:
+                    for key in fieldnames[len(values):]:
+                        row[key] = None
+                batch.append(row)
+            if batch:
+                yield batch
 
 
 def get_latest_GO_filename(go_file):
-    """ Get the name of the current GO termdb.obo-xml.gz file. """
+    """ Get the name of the current GO termdb.obo-xml.gz file, or None if
+    it cannot be determined. """
     url = go_file
     if url[-3:] == '.gz':
         url = url[:url.rfind('/')]
@@ -87,7 +651,7 @@ def get_latest_GO_filename(go_file):
         print(
             'WARNING! [function get_latest_GO_filename] Unable to fetch URL: %s\n' %
             (url))
-        return go_file
+        return None
     # file matching pattern for resoure filename
     p_fn = re.compile('go_\d+-termdb.obo-xml.gz', re.M | re.S)
     try:
@@ -98,27 +662,89 @@ def get_latest_GO_filename(go_file):
         print(
             'WARNING! [function get_latest_GO_filename] Unable to identify data file in %s\n' %
             (url))
-        pass
+        return None
     return go_file
 
 
 def get_latest_MeSH_filename(url, prefix, suffix):
     """ Get the URL of the current MeSH file, given the directory url and file prefix.
     For example, the ASCII MeSH Descriptors file will start with prefix 'd' and be found in
-    ftp://nlmpubs.nlm.nih.gov/online/mesh/.asciimesh/. """
+    ftp://nlmpubs.nlm.nih.gov/online/mesh/.asciimesh/. Returns None if the
+    directory cannot be listed. """
+    urltokens = urllib.parse.urlsplit(url)
     try:
-        directory = urllib.request.urlopen(url)
-    except:
+        with ftp_pool.session(urltokens.netloc) as ftp:
+            filenames = [os.path.basename(fn) for fn in ftp.nlst(urltokens.path)]
+    except ftplib.all_errors:
         print('WARNING! unable to fetch URL: {0}'.format(url))
-    filenames = []
-    for line in directory:
-        line = line.decode('cp1252')
-        filenames.append(line.split()[-1])
+        return None
     filenames = sorted([filename for filename in filenames if (
         filename.startswith(prefix) and filename.endswith(suffix))])
-    current_file = '/'.join([url, filenames[-1]])
+    if not filenames:
+        print('WARNING! no {0}*{1} file found in {2}'.format(prefix, suffix, url))
+        return None
+    current_file = '/'.join([url.rstrip('/'), filenames[-1]])
     return current_file
 
+
+class LatestURL(object):
+
+    ''' The URL of the latest release of a source file, e.g. the current GO
+    archive or MeSH descriptor file. Finding it takes a network round trip,
+    so the resolver is only called when the URL is first needed (see
+    resolve_url), and the result is cached in latest_urls.json in the
+    working directory for ttl seconds. If the resolver fails, an expired
+    cached URL is used instead. '''
+
+    cache_file = 'latest_urls.json'
+    _lock = threading.Lock()
+
+    def __init__(self, key, resolver, *args, ttl=24 * 60 * 60):
+        self.key = key
+        self.resolver = resolver
+        self.args = args
+        self.ttl = ttl
+        self.url = None
+
+    def resolve(self):
+        if self.url is not None:
+            return self.url
+        with LatestURL._lock:
+            try:
+                with open(self.cache_file) as f:
+                    cache = json.load(f)
+            except (OSError, ValueError):
+                cache = {}
+            entry = cache.get(self.key)
+            if entry and time.time() - entry['resolved_at'] < self.ttl:
+                self.url = entry['url']
+                return self.url
+            url = self.resolver(*self.args)
+            if url is None:
+                if entry is None:
+                    raise ValueError(
+                        'unable to resolve latest URL for ' + self.key)
+                print('WARNING! using cached URL for {0}: {1}'.format(
+                    self.key, entry['url']))
+                self.url = entry['url']
+                return self.url
+            cache[self.key] = {'url': url, 'resolved_at': time.time()}
+            with open(self.cache_file, 'w') as f:
+                json.dump(cache, f, indent=2, sort_keys=True)
+            self.url = url
+            return self.url
+
+    def __str__(self):
+        return self.resolve()
+
+
+def resolve_url(location):
+    """ Return the source URL for a baseline_data location, which is either
+    a URL string or a LatestURL. """
+    if isinstance(location, LatestURL):
+        return location.resolve()
+    return location
+
 p1 = re.compile('Last modified: ?(.*?)[\n|$]', re.M | re.S)
 p2 = re.compile('Downloaded at: ?(.*?)[\n|$]', re.M | re.S)
 p3 = re.compile('Filename: ?(.*?)[\n|$]', re.M | re.S)
@@ -213,7 +839,7 @@ def get_citation_info(name, header, data_file):
 
     # parse version and date from dataset file
     if data_file.find('chebi') >= 0:
-        f = open('./datasets/' + data_file, 'r')
+        f = open_source('./datasets/' + data_file, 'utf-8')
         # break loop on 0 value
         sentinel = 2
         while True:
@@ -232,7 +858,7 @@ def get_citation_info(name, header, data_file):
         f.close()
 
     elif data_file.find('doid') >= 0:
-        f = open('./datasets/' + data_file, 'r')
+        f = open_source('./datasets/' + data_file, 'utf-8')
         while True:
             line = f.readline().strip()
             if not line:
@@ -246,12 +872,11 @@ def get_citation_info(name, header, data_file):
         f.close()
 
     elif data_file.find('go') >= 0 and data_file:
-        f = gzip.open('./datasets/' + data_file, 'r')
+        f = open_source('./datasets/' + data_file, 'utf-8')
         while True:
             line = f.readline().strip()
             if not line:
                 break
-            line = str(line, 'utf-8')
             if line.find('<data-version>') >= 0:
                 pubver = p_go_1.search(line).group(1)
             elif line.find('<date>') >= 0:
@@ -262,7 +887,7 @@ def get_citation_info(name, header, data_file):
         f.close()
 
     elif data_file.find('rgd') >= 0:
-        f = open('./datasets/' + data_file, 'r')
+        f = open_source('./datasets/' + data_file, 'utf-8')
         while True:
             line = f.readline().strip()
             if not line:
@@ -275,7 +900,7 @@ def get_citation_info(name, header, data_file):
         f.close()
 
     elif data_file.find('affy') >= 0:
-        f = etree.iterparse('./datasets/' + data_file)
+        f = etree.iterparse(open_source('./datasets/' + data_file))
         for action, elem in f:
             # mapping version and date to HG-U133_Plus_2 Array
             if elem.tag == 'Array' and elem.get('name') == 'HG-U133_Plus_2':
@@ -9,7 +9,8 @@
  baseline_data - ordered dictionary mapping each source/input file
  to its parser and resulting data objects. The local file name is
  mapped to a data tuple containing:
-    [0] the source file url
+    [0] the source file url, or a common.LatestURL for sources whose
+        file name changes with each release (resolved in Phase I only)
     [1] the parser
     [2] the data object, or a list of data objects
         in the case that multiple objects are generated from the same file
@@ -24,18 +25,48 @@
  affy_array_names - list of array names to include in the AFFX (Affymetrix
  probe set) namespace. This list is consumed by parsers.AffyParser.
 
+ large_downloads - local file names of the largest source files, largest
+ first. gp_baseline starts these downloads before the others to shorten the
+ total Phase I run time.
+
+ max_host_connections - maximum number of concurrent Phase I downloads
+ from any one host.
+
+ swissprot_format - 'xml' or 'dat', the UniProt file Swiss-Prot is read from.
+
+ parser_workers - default of gp_baseline -w: number of worker processes a
+ parser may use for one file (1 parses in the Phase II process, 0 uses one
+ per CPU).
+
+ stored_data - the largest data objects, whose dictionaries are kept on
+ disk (see data_store.py) when gp_baseline is run with --store; their
+ values are not changed once built. store_cache_size - number of values
+ of each of them kept in memory.
+
 
 '''
 
 from collections import OrderedDict
 from common import get_latest_GO_filename
 from common import get_latest_MeSH_filename
+from common import LatestURL
 from datasets import *
 import parsers
 import os
 
 file_url = 'file://{0}/datasets/'.format(os.getcwd())
 
+# seconds for which a resolved LatestURL is reused
+latest_url_ttl = 24 * 60 * 60
+
+# source of the Swiss-Prot data: 'xml' (uniprot_sprot.xml.gz) or 'dat'
+# (the flat file uniprot_sprot.dat.gz, faster to parse); both give the same
+# records - see benchmark.py
+swissprot_format = 'xml'
+
+# worker processes per parsed file - see gp_baseline -w
+parser_workers = 1
+
 baseline_data = OrderedDict()
 
 egid_data = EntrezInfoData()
@@ -88,10 +119,16 @@ baseline_data['RGD_ORTHOLOGS.txt'] = (
     rgd_ortho_data)
 
 sp_data = SwissProtData()
-baseline_data['swiss.xml.gz'] = (
-    'ftp://ftp.uniprot.org/pub/databases/uniprot/current_release/knowledgebase/complete/uniprot_sprot.xml.gz',
-    parsers.SwissProtParser,
-    sp_data)
+if swissprot_format == 'dat':
+    baseline_data['swiss.dat.gz'] = (
+        'ftp://ftp.uniprot.org/pub/databases/uniprot/current_release/knowledgebase/complete/uniprot_sprot.dat.gz',
+        parsers.SwissProtDatParser,
+        sp_data)
+else:
+    baseline_data['swiss.xml.gz'] = (
+        'ftp://ftp.uniprot.org/pub/databases/uniprot/current_release/knowledgebase/complete/uniprot_sprot.xml.gz',
+        parsers.SwissProtParser,
+        sp_data)
 
 sp_history_data = HistoryDataSet(prefix='sp')
 baseline_data['delac_sp.txt'] = (
@@ -169,7 +206,11 @@ baseline_data['taxnames_9606_10090_10116.dmp'] = (
     tax_data)
 
 # - get the latest GO archive file name and URL
-go_file = get_latest_GO_filename('http://archive.geneontology.org/latest-full')
+go_file = LatestURL(
+    'go.xml.gz',
+    get_latest_GO_filename,
+    'http://archive.geneontology.org/latest-full',
+    ttl=latest_url_ttl)
 gobp_dict, gocc_dict = {}, {}
 gobp_data = GOData(
     gobp_dict,
@@ -187,8 +228,11 @@ baseline_data['go.xml.gz'] = (
     go_file, parsers.GOParser, [
         gobp_data, gocc_data])
 
-mesh_file = get_latest_MeSH_filename(
-    'ftp://nlmpubs.nlm.nih.gov/online/mesh/.asciimesh/', 'd', '.bin')
+mesh_file = LatestURL(
+    'mesh.bin',
+    get_latest_MeSH_filename,
+    'ftp://nlmpubs.nlm.nih.gov/online/mesh/.asciimesh/', 'd', '.bin',
+    ttl=latest_url_ttl)
 meshcl_dict, meshd_dict, meshpp_dict, meshc_dict, mesha_dict = {}, {}, {}, {}, {}
 meshcl_data = MESHData(
     meshcl_dict,
@@ -225,8 +269,11 @@ mesha_data = MESHData(
 baseline_data['mesh.bin'] = (
     mesh_file, parsers.MESHParser, [
         meshcl_data, meshd_data, meshpp_data, meshc_data, mesha_data])
-mesh_sup_file = get_latest_MeSH_filename(
-    'ftp://nlmpubs.nlm.nih.gov/online/mesh/.asciimesh/', 'c2', '.bin')
+mesh_sup_file = LatestURL(
+    'meshc.bin',
+    get_latest_MeSH_filename,
+    'ftp://nlmpubs.nlm.nih.gov/online/mesh/.asciimesh/', 'c2', '.bin',
+    ttl=latest_url_ttl)
 baseline_data['meshc.bin'] = (
     mesh_sup_file,
     parsers.MESHParser, [meshc_data]
@@ -325,3 +372,11 @@ data_file_info = {
     'rgd-rat-genes.beleq': 'entrez_info.gz',
 }
 
+# Phase I download scheduling - see gp_baseline
+large_downloads = ['gene2acc.gz', 'swiss.xml.gz', 'swiss.dat.gz', 'uberon.owl']
+max_host_connections = 2
+
+# data objects kept on disk with gp_baseline --store - see data_store.py
+stored_data = [egid_data, entrez_history_data, hgnc_data, mgi_data, rgd_data,
+               sp_data, gene2acc_data, affx_data]
+store_cache_size = 100000
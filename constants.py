@@ -35,3 +35,13 @@ NAME = 2
 MARKER_TYPE = 3
 RGD_ID = 3
 
+# RefSeq status ranking (0 the best). Used to keep the best status of each
+# gene in gene2accession, and to resolve probe sets that map to more than
+# one Entrez gene.
+REFSEQ_STATUS_RANK = {'REVIEWED': 0,
+                      'VALIDATED': 1,
+                      'PROVISIONAL': 2,
+                      'PREDICTED': 3,
+                      'MODEL': 4,
+                      'INFERRED': 5,
+                      '-': 6}
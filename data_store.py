@@ -0,0 +1,161 @@
+# coding: utf-8
+
+'''
+ data_store.py
+
+ Disk-backed storage for the dictionaries of the larger data objects
+ (see parsed.py). SQLiteDict is a mapping kept in an SQLite database, one
+ per data object: records are written to it in phase II and read back on
+ demand by the phases after it, through a bounded in-memory cache, so the
+ data objects need not fit in memory. A data object stored this way
+ pickles only the path of its database, so the *.parsed_data.pickle
+ files stay small and load at once.
+
+ Values are pickled, so they must not be changed in place once stored
+ (the record types of records.py cannot be).
+
+'''
+
+from collections import OrderedDict
+from collections.abc import MutableMapping
+import os
+import pickle
+import sqlite3
+
+# marks a key missing from the pending writes or the cache
+_missing = object()
+
+
+class SQLiteDict(MutableMapping):
+
+    ''' Mapping kept in the SQLite database at path. The last cache_size
+    values read are kept in memory (least recently used first out), and
+    writes are buffered and stored write_batch at a time. Keys are strings
+    or numbers; they are iterated in insertion order, as for a dict. '''
+
+    write_batch = 10000
+    page_size = 1000
+
+    def __init__(self, path, cache_size=100000, create=True):
+        self.path = path
+        self.cache_size = cache_size
+        self.create = create
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._connection = None
+        self._pid = None
+
+    def _db(self):
+        """ Return the connection to the database of this process, opening
+        it (again, in a forked child) if needed. """
+        if self._pid != os.getpid():
+            if self.create:
+                connection = sqlite3.connect(self.path, isolation_level=None)
+            else:
+                # a database that disappeared is an error, not a new mapping
+                connection = sqlite3.connect(
+                    'file:{0}?mode=rw'.format(self.path), isolation_level=None,
+                    uri=True)
+            connection.execute('PRAGMA synchronous = OFF')
+            connection.execute('CREATE TABLE IF NOT EXISTS items '
+                               '(key BLOB NOT NULL PRIMARY KEY, value BLOB)')
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def flush(self):
+        """ Store the pending writes. """
+        if not self._pending:
+            return
+        db = self._db()
+        db.execute('BEGIN')
+        # an upsert keeps the rowid, and so the order, of a replaced key
+        db.executemany(
+            'INSERT INTO items VALUES (?, ?) ON CONFLICT (key) '
+            'DO UPDATE SET value = excluded.value',
+            ((key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+             for key, value in self._pending.items()))
+        db.execute('COMMIT')
+        self._pending.clear()
+
+    def __getitem__(self, key):
+        value = self._pending.get(key, _missing)
+        if value is not _missing:
+            return value
+        value = self._cache.get(key, _missing)
+        if value is not _missing:
+            self._cache.move_to_end(key)
+            return value
+        row = self._db().execute(
+            'SELECT value FROM items WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        value = pickle.loads(row[0])
+        self._remember(key, value)
+        return value
+
+    def __setitem__(self, key, value):
+        self._cache.pop(key, None)
+        self._pending[key] = value
+        if len(self._pending) >= self.write_batch:
+            self.flush()
+
+    def __delitem__(self, key):
+        found = self._pending.pop(key, _missing) is not _missing
+        self._cache.pop(key, None)
+        cursor = self._db().execute('DELETE FROM items WHERE key = ?', (key,))
+        if not found and cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self._pending or key in self._cache:
+            return True
+        return self._db().execute(
+            'SELECT 1 FROM items WHERE key = ?', (key,)).fetchone() is not None
+
+    def _remember(self, key, value):
+        self._cache[key] = value
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def __iter__(self):
+        self.flush()
+        db = self._db()
+        # read a page of items at a time, so the caller can read (or write)
+        # values while iterating; the values of the page are cached, as the
+        # data objects mostly read the value of each key they iterate over
+        rowid = 0
+        while True:
+            rows = db.execute(
+                'SELECT rowid, key, value FROM items WHERE rowid > ? '
+                'ORDER BY rowid LIMIT ?', (rowid, self.page_size)).fetchall()
+            if not rows:
+                return
+            for rowid, key, value in rows:
+                if key not in self._cache and key not in self._pending:
+                    self._remember(key, pickle.loads(value))
+                yield key
+
+    def __len__(self):
+        self.flush()
+        return self._db().execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    def clear(self):
+        self._pending.clear()
+        self._cache.clear()
+        self._db().execute('DELETE FROM items')
+
+    def close(self):
+        """ Store the pending writes and close the database. """
+        self.flush()
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = self._pid = None
+
+    def __reduce__(self):
+        # pickled by reference: the database is opened where it is loaded
+        self.flush()
+        return (type(self), (self.path, self.cache_size, False))
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(type(self).__name__, self.path)
@@ -13,6 +13,7 @@
 import os.path
 import time
 from common import get_citation_info
+from constants import REFSEQ_STATUS_RANK
 from collections import defaultdict
 
 
@@ -779,6 +780,19 @@ class Gene2AccData(DataSet):
             taxid = mapping.get('tax_id')
             yield entrez_gene, status, taxid
 
+    def get_status(self, entrez_gene):
+        """ Return the best RefSeq status of entrez_gene (human, mouse or
+        rat), or None if it has no RefSeq status. """
+        mapping = self._dict.get(entrez_gene)
+        if mapping is None:
+            return None
+        status = mapping.get('status')
+        if status == '-' or status not in REFSEQ_STATUS_RANK:
+            return None
+        if mapping.get('tax_id') not in ('9606', '10116', '10090'):
+            return None
+        return status
+
 
 class GOData(NamespaceDataSet, HistoryDataSet):
     # dictionary is required, since GO file parsed into multiple objects
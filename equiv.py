@@ -16,6 +16,7 @@ import parsed
 import os
 from collections import defaultdict
 from common import get_citation_info
+from constants import REFSEQ_STATUS_RANK
 
 # stores xrefs from EGID dataset to build equivalences
 # to HGNC, MGI, and RGD - see resolve_entrez_id()
@@ -115,17 +116,9 @@ def equiv(d, verbose):
         if parsed.gene2acc_data is None or len(
                 parsed.gene2acc_data._dict) == 0:
             print('Missing required dependency data gene2acc_data')
-            refseq = {}
+            refseq_status = {}.get
         else:
-            refseq = build_refseq(parsed.gene2acc_data)
-
-        ref_status = {'REVIEWED': 0,
-                      'VALIDATED': 1,
-                      'PROVISIONAL': 2,
-                      'PREDICTED': 3,
-                      'MODEL': 4,
-                      'INFERRED': 5,
-                      '-': 6}
+            refseq_status = parsed.gene2acc_data.get_status
 
         for term_id in d.get_values():
             uid = None
@@ -142,8 +135,8 @@ def equiv(d, verbose):
             elif len(entrez_ids) > 1:
                 adjacent_list = []
                 for entrez_gene in entrez_ids:
-                    refstatus = refseq.get(entrez_gene)
-                    adjacent_list.append(ref_status.get(refstatus))
+                    refstatus = refseq_status(entrez_gene)
+                    adjacent_list.append(REFSEQ_STATUS_RANK.get(refstatus))
                     # zipping yields a list of tuples like [('5307',0), ('104',2), ('3043',None)]
                     # i.e. [(entrez_id, refseq_status)]
                     list_of_tuples = list(zip(entrez_ids, adjacent_list))
@@ -309,19 +302,6 @@ def equiv(d, verbose):
         write_root_beleq(d, verbose)
 
 
-def build_refseq(d):
-    """ Uses parsed gene2acc file to build dict mapping (entrez_gene -> refseq status). """
-    refseq = {}
-    for entrez_gene, status, taxid in d.get_eq_values():
-        target_pool = ['9606', '10116', '10090']
-        valid_status = ['REVIEWED', 'VALIDATED', 'PROVISIONAL', 'PREDICTED',
-                        'MODEL', 'INFERRED']
-
-        if taxid in target_pool and status in valid_status:
-            refseq[entrez_gene] = status
-    return refseq
-
-
 def write_beleq(eq_dict, filename, source_file):
     """ Writes values and uuids from equivalence dictionary to .beleq file. """
     fullname = '.'.join((filename, 'beleq'))
@@ -13,6 +13,15 @@
    -e    resource-generator phase to end at [1,2,3,4,5] (>= begin phase)
    -n	 the directory to store the new equivalence data
    -p    pickle file name suffix for parsed data
+   -d    number of concurrent downloads in phase 1
+   -c    only download source files that changed upstream (phase 1)
+   --cache  shared cache directory of source files (phase 1) and parsed
+            ontologies (phase 2), reused across runs
+   -j    number of source files parsed in parallel in phase 2
+   -w    number of worker processes each parser may use for one file in
+         phase 2, without -j (0 for one per CPU)
+   --store  directory of the SQLite databases the largest data objects are
+            kept in from phase 2 on, instead of in memory
    -v	 enables verbose mode
 
  phases:
@@ -28,11 +37,15 @@ from configuration import *
 import argparse
 import os
 import parsed
+import parsers
 import pickle
 import time
 import shutil
 import equiv
-from common import download
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from common import download, download_all, ftp_pool, resolve_url
+from source_cache import SourceCache
 from datasets import NamespaceDataSet, DataSet
 from constants import PARSER_TYPE, RES_LOCATION
 
@@ -96,6 +109,42 @@ parser.add_argument(
     type=str,
     default='parsed_data.pickle',
     help="pickle file name suffix for parsed data")
+parser.add_argument(
+    "-d",
+    "--download_threads",
+    type=int,
+    default=8,
+    help="number of concurrent downloads in phase 1")
+parser.add_argument(
+    "-c",
+    "--conditional",
+    required=False,
+    action="store_true",
+    help="only download source files that changed since the last download")
+parser.add_argument(
+    "--cache",
+    metavar="DIRECTORY",
+    help="shared cache of downloaded source files (linked into datasets/) "
+    "and parsed ontologies, reused by other runs and working directories")
+parser.add_argument(
+    "-j",
+    "--jobs",
+    type=int,
+    default=1,
+    help="number of processes used to parse source files in phase 2")
+parser.add_argument(
+    "-w",
+    "--workers",
+    type=int,
+    default=parser_workers,
+    help="number of worker processes the Swiss-Prot, MeSH and Affymetrix "
+    "parsers may use for one file in phase 2, without -j (0 for one per "
+    "CPU; default %(default)s, in this process)")
+parser.add_argument(
+    "--store",
+    metavar="DIRECTORY",
+    help="keep the largest parsed data objects in SQLite databases in "
+    "DIRECTORY, read on demand by the later phases, instead of in memory")
 args = parser.parse_args()
 
 verbose = args.verbose
@@ -106,6 +155,11 @@ if args.begin_phase > args.end_phase:
     args.end_phase = args.begin_phase
     print('Reseting end phase to match begin phase: %d.' % (args.end_phase))
 
+# the shared cache and store directories are resolved before changing
+# directory
+cache_dir = os.path.abspath(args.cache) if args.cache else None
+store_dir = os.path.abspath(args.store) if args.store else None
+
 resource_dir = args.n[0]
 if not os.path.exists(resource_dir):
     os.mkdir(resource_dir)
@@ -158,17 +212,49 @@ start_time = time.time()
 
 if args.begin_phase <= 1:
     print('\n======= Phase I, downloading data =======')
+    downloads = []
     for name, url_tuple in baseline_data.items():
-        if verbose:
-            print('Downloading ' + str(name))
-            sys.stdout.flush()
         path = os.path.join('datasets/', name)
-        # if url_tuple[RES_LOCATION].startswith('http') or \
-        # url_tuple[RES_LOCATION].startswith('ftp'):
-        loc = url_tuple[RES_LOCATION]
+        try:
+            loc = resolve_url(url_tuple[RES_LOCATION])
+        except ValueError as e:
+            print('ERROR - {0}'.format(e))
+            sys.exit(1)
         if any([loc.startswith(x) for x in ['file', 'ftp', 'http']]):
-            download(url_tuple[RES_LOCATION], path)
-            print(loc)
+            downloads.append((loc, path))
+
+    def download_order(download):
+        # known large files first (largest first), then the rest by the
+        # size of any copy left by a previous run
+        name = os.path.basename(download[1])
+        if name in large_downloads:
+            return (0, large_downloads.index(name))
+        if os.path.exists(download[1]):
+            return (1, -os.path.getsize(download[1]))
+        return (1, 0)
+
+    downloads.sort(key=download_order)
+    fetch = download
+    if cache_dir:
+        fetch = SourceCache(cache_dir).install
+        if verbose:
+            print('Using shared source cache ' + cache_dir)
+    updated, failures = download_all(downloads, args.download_threads,
+                                     max_host_connections, verbose,
+                                     args.conditional, fetch)
+    ftp_pool.close()
+    if args.conditional:
+        print('\n{0} of {1} source files changed upstream:'.format(
+            len(updated), len(downloads)))
+        for url, path in updated:
+            print('\t' + path)
+    for url, path, error in failures:
+        print('ERROR - unable to download {0} to {1}: {2}'.format(
+            url, path, error))
+    if failures:
+        print('\nTerminating process; {0} download(s) failed.'.format(
+            len(failures)))
+        sys.exit(1)
     print('Phase 1 ran in %.3f minutes' % ((time.time() - start_time) / 60))
 
     if args.end_phase == 1:
@@ -184,46 +270,55 @@ sys.stdout.flush()
 
 if args.begin_phase <= 2:
     print('\n======= Phase II, parsing data =======')
-    # For now, download and store the data in the parsed.py module. This module
-    # could be replaced or re-implemented using something like DBM to help with
-    # memory usage.
+    # the data is stored in the data objects of the parsed.py module; with
+    # --store, the largest of them are kept on disk (see data_store.py) and
+    # their pickles only refer to their databases
     interval_time = time.time()
-    working_dir = os.getcwd()
+    if store_dir:
+        parsed.use_store(store_dir)
+    # parsers start their own worker processes only when asked to, and
+    # never inside the -j workers (see parsed.parse_files)
+    parsers.Parser.workers = args.workers
+    if cache_dir:
+        parsers.AffyParser.cache_dir = cache_dir
+        parsers.OntologyParser.cache_dir = os.path.join(
+            cache_dir, 'ontologies')
     # object_dict is dictionary with keys = prefix + '_data' and value = data object
     # use object_dict to access data objects by name
     object_dict = {}
-    for root, dirs, filenames in os.walk(working_dir):
-        for fn in filenames:
-            if fn in baseline_data:
-                try:
-                    data_tuple = baseline_data.get(fn)
-                    data_object = data_tuple[2]
-                    parser = data_tuple[PARSER_TYPE]('datasets/' + fn)
-                    if verbose:
-                        parser.is_verbose()
-                        print(
-                            'Running {0} on file {1}'.format(
-                                str(parser), fn))
-                except:
-                    print(
-                        'WARNING - skipping {0}; file not properly configured'.format(fn))
-                    continue
-                for x in parser.parse():
-                    parsed.build_data(x, str(parser), data_object)
-                # if data_tuple[2] is a list of objects, handle list
-                if isinstance(data_object, list):
-                    for o in data_object:
-                        o.source_file = fn
-                        with open(str(o) + '.' + args.parsed_pickle, 'wb') as f:
-                            pickle.dump(o, f, pickle.HIGHEST_PROTOCOL)
-                        object_dict[str(o) + '_data'] = o
-                    continue
-                # if data_tuple[2] is a single object
-                elif isinstance(data_object, DataSet):
-                    data_object.source_file = fn
-                    with open(str(data_object) + '.' + args.parsed_pickle, 'wb') as f:
-                        pickle.dump(data_object, f, pickle.HIGHEST_PROTOCOL)
-                    object_dict[str(data_object) + '_data'] = data_object
+    # parse the source files in baseline_data order, so that files feeding
+    # the same data object (mesh.bin, meshc.bin) are merged the same way
+    file_names = [fn for fn in baseline_data
+                  if os.path.exists(os.path.join('datasets', fn))]
+    if args.jobs > 1:
+        # each worker parses a group of files and pickles the data objects
+        # it built; the pickles are then loaded here. Workers are forked
+        # (this script has no __main__ guard to re-import under 'spawn').
+        groups = parsed.group_files(file_names)
+
+        def group_size(group):
+            return sum(os.path.getsize(os.path.join('datasets', fn))
+                       for fn in group)
+
+        with ProcessPoolExecutor(
+                args.jobs, multiprocessing.get_context('fork')) as executor:
+            # start the largest groups first; results are kept in order
+            futures = {}
+            for group in sorted(groups, key=group_size, reverse=True):
+                futures[tuple(group)] = executor.submit(
+                    parsed.parse_files, group, args.parsed_pickle, verbose)
+            results = [futures[tuple(group)].result() for group in groups]
+        for names in results:
+            for name in names:
+                with open(name + '.' + args.parsed_pickle, 'rb') as f:
+                    object_dict[name + '_data'] = pickle.load(f)
+        # data needed by equiv in phase V
+        parsed.do_data = object_dict.get('do_data')
+        parsed.gene2acc_data = object_dict.get('gene2acc_data')
+    else:
+        for fn in file_names:
+            for o in parsed.parse_file(fn, args.parsed_pickle, verbose):
+                object_dict[str(o) + '_data'] = o
 
     print('Phase II ran in %.3f minutes' %
           ((time.time() - interval_time) / 60))
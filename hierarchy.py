@@ -0,0 +1,222 @@
+# coding: utf-8
+
+'''
+ hierarchy.py
+
+ An index of an ontology's is_a / subClassOf hierarchy, used to answer
+ "is X a descendant of Y" without walking the graph for each question.
+ Nodes are given integer codes; parents and children are kept as CSR
+ (compressed sparse row) arrays, and the transitive closure both ways, as
+ sorted CSR arrays of the ancestor codes and of the descendant codes of
+ each node, so neither ancestors() nor descendants() walks the graph.
+ is_descendant() also keeps the descendants of each ancestor it is asked
+ about as a bitset.
+
+ An index is built by a parser from the edges it reads, and saved beside
+ the pickled data objects (see save_index); it is reused while the
+ source file is unchanged (see load_index).
+
+'''
+
+from array import array
+from collections import defaultdict
+import os
+import pickle
+
+
+class HierarchyIndex(object):
+
+    ''' Index of a hierarchy given as (child, parent) edges between
+    hashable node ids (e.g. 'GO:0032991' or a class URI). Nodes without
+    edges may be listed in nodes. '''
+
+    # version of the saved layout; older saved indexes are rebuilt
+    version = 2
+
+    def __init__(self, edges, nodes=()):
+        parents = defaultdict(list)
+        self.nodes = []
+        self.codes = {}
+        for node in nodes:
+            self._code(node)
+        for child, parent in edges:
+            c, p = self._code(child), self._code(parent)
+            if c != p and p not in parents[c]:
+                parents[c].append(p)
+        n = len(self.nodes)
+        children = defaultdict(list)
+        for c in range(n):
+            for p in parents[c]:
+                children[p].append(c)
+        self.parent_ptr, self.parent_idx = self._csr(parents, n)
+        self.child_ptr, self.child_idx = self._csr(children, n)
+        self.ancestor_ptr, self.ancestor_idx = self._closure(n)
+        # the closure inverted: a node's descendants, in code order
+        descendants = defaultdict(list)
+        for c in range(n):
+            for a in self._ancestor_codes(c):
+                descendants[a].append(c)
+        self.descendant_ptr, self.descendant_idx = self._csr(descendants, n)
+        self.format = self.version
+        self.source = None
+        self._bitsets = {}
+
+    def _code(self, node):
+        code = self.codes.get(node)
+        if code is None:
+            code = self.codes[node] = len(self.nodes)
+            self.nodes.append(node)
+        return code
+
+    @staticmethod
+    def _csr(lists, n):
+        ptr = array('l', [0])
+        idx = array('l')
+        for i in range(n):
+            idx.extend(lists.get(i, ()))
+            ptr.append(len(idx))
+        return ptr, idx
+
+    def _parent_codes(self, code):
+        return self.parent_idx[self.parent_ptr[code]:self.parent_ptr[code + 1]]
+
+    def _child_codes(self, code):
+        return self.child_idx[self.child_ptr[code]:self.child_ptr[code + 1]]
+
+    def _ancestor_codes(self, code):
+        return self.ancestor_idx[
+            self.ancestor_ptr[code]:self.ancestor_ptr[code + 1]]
+
+    def _descendant_codes(self, code):
+        return self.descendant_idx[
+            self.descendant_ptr[code]:self.descendant_ptr[code + 1]]
+
+    def _closure(self, n):
+        # ancestors of each node, in topological order (parents first);
+        # nodes on a cycle are finished with a plain traversal
+        ancestors = [None] * n
+        pending = [len(self._parent_codes(c)) for c in range(n)]
+        ready = [c for c in range(n) if pending[c] == 0]
+        while ready:
+            c = ready.pop()
+            anc = set()
+            for p in self._parent_codes(c):
+                anc.add(p)
+                anc.update(ancestors[p])
+            ancestors[c] = anc
+            for child in self._child_codes(c):
+                pending[child] -= 1
+                if pending[child] == 0:
+                    ready.append(child)
+        for c in range(n):
+            if ancestors[c] is None:
+                ancestors[c] = self._walk(c, self._parent_codes)
+        return self._csr(
+            dict((c, sorted(a)) for c, a in enumerate(ancestors)), n)
+
+    @staticmethod
+    def _walk(code, step):
+        seen = set()
+        stack = [code]
+        while stack:
+            for other in step(stack.pop()):
+                if other not in seen:
+                    seen.add(other)
+                    stack.append(other)
+        seen.discard(code)
+        return seen
+
+    def __contains__(self, node):
+        return node in self.codes
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def parents(self, node):
+        """ Return the direct parents of node. """
+        if node not in self.codes:
+            return []
+        return [self.nodes[p] for p in self._parent_codes(self.codes[node])]
+
+    def children(self, node):
+        """ Return the direct children of node. """
+        if node not in self.codes:
+            return []
+        return [self.nodes[c] for c in self._child_codes(self.codes[node])]
+
+    def ancestors(self, node):
+        """ Return all ancestors of node (not including node). """
+        if node not in self.codes:
+            return []
+        return [self.nodes[a]
+                for a in self._ancestor_codes(self.codes[node])]
+
+    def _descendant_bits(self, code):
+        bits = self._bitsets.get(code)
+        if bits is None:
+            bits = bytearray((len(self.nodes) + 7) // 8)
+            for d in self._descendant_codes(code):
+                bits[d >> 3] |= 1 << (d & 7)
+            self._bitsets[code] = bits
+        return bits
+
+    def descendants(self, node):
+        """ Return the set of all descendants of node (not including
+        node). They are read from the precomputed closure, without walking
+        the hierarchy; the only cost is that of building the set. """
+        if node not in self.codes:
+            return set()
+        return set(self.nodes[d]
+                   for d in self._descendant_codes(self.codes[node]))
+
+    def is_descendant(self, node, ancestor):
+        """ True if node is a descendant (subclass, at any depth) of
+        ancestor. The descendants of ancestor are found once and kept as a
+        bitset, so repeated questions about one ancestor are O(1). """
+        code = self.codes.get(node)
+        if code is None or ancestor not in self.codes:
+            return False
+        bits = self._descendant_bits(self.codes[ancestor])
+        return bool(bits[code >> 3] >> (code & 7) & 1)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_bitsets'] = {}
+        return state
+
+
+def source_signature(source):
+    """ Return the size and modification time of the file source, used to
+    tell whether a saved index is still current. """
+    st = os.stat(source)
+    return (st.st_size, st.st_mtime_ns)
+
+
+def index_path(source, directory='.'):
+    """ Return the path an index of source is saved at: beside the pickled
+    data objects, which are written to the working directory. """
+    return os.path.join(directory, os.path.basename(source) + '.hierarchy')
+
+
+def save_index(index, source, directory='.'):
+    """ Save index, built from the file source, for load_index. """
+    index.source = source_signature(source)
+    path = index_path(source, directory)
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(index, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+
+
+def load_index(source, directory='.'):
+    """ Return the index saved for the file source, or None if there is
+    none or source has changed since it was saved. """
+    path = index_path(source, directory)
+    try:
+        with open(path, 'rb') as f:
+            index = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if getattr(index, 'format', 1) != HierarchyIndex.version or \
+            index.source != source_signature(source):
+        return None
+    return index
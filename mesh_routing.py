@@ -0,0 +1,97 @@
+# coding: utf-8
+
+'''
+ mesh_routing.py
+
+ Decides which MeSH namespaces (and annotations) a MeSH record belongs
+ to, from its tree numbers, unique identifier and semantic types. Used
+ by parsed.py to build the MeSH data objects and by belanno.py to write
+ the MeSH .belanno files.
+
+ namespaces:
+   meshcs    cellular structures (A11.284)
+   meshd     diseases (C, F03)
+   meshpp    processes (G, except G01, G15 and G17)
+   meshc     chemicals (D, and supplementary concepts), of a chemical
+             semantic type or of none
+   mesha     anatomy (A, except A13 and A18 to A21)
+
+'''
+
+# (tree number prefix, namespace, include) rules. A rule applies to the
+# tree numbers under its prefix; a longer prefix overrides a shorter one.
+TREE_RULES = (
+    ('A', 'mesha', True),
+    ('A13', 'mesha', False),
+    ('A18', 'mesha', False),
+    ('A19', 'mesha', False),
+    ('A20', 'mesha', False),
+    ('A21', 'mesha', False),
+    ('A11.284', 'meshcs', True),
+    ('C', 'meshd', True),
+    ('F03', 'meshd', True),
+    ('G', 'meshpp', True),
+    ('G01', 'meshpp', False),
+    ('G15', 'meshpp', False),
+    ('G17', 'meshpp', False),
+    ('D', 'meshc', True))
+
+# semantic types of chemicals
+# see http://semanticnetwork.nlm.nih.gov/SemGroups/SemGroups.txt
+CHEMICAL_TYPES = frozenset((
+    'T116', 'T195', 'T123', 'T122', 'T118', 'T103', 'T120', 'T104', 'T200',
+    'T111', 'T196', 'T126', 'T131', 'T125', 'T129', 'T130', 'T197', 'T119',
+    'T124', 'T114', 'T109', 'T115', 'T121', 'T192', 'T110', 'T127'))
+
+
+class TreeTrie(object):
+
+    ''' Prefix trie over MeSH tree numbers, compiled from (prefix,
+    namespace, include) rules. Each node holds the namespaces of the tree
+    numbers under it, so a lookup is one walk down the trie. '''
+
+    def __init__(self, rules):
+        # a node is [children by character, namespaces]
+        self.root = [{}, frozenset()]
+        # shorter prefixes first, so a new node starts from the result of
+        # the rules above it
+        for prefix, namespace, include in sorted(
+                rules, key=lambda rule: len(rule[0])):
+            node = self.root
+            for c in prefix:
+                if c not in node[0]:
+                    node[0][c] = [{}, node[1]]
+                node = node[0][c]
+            if include:
+                node[1] = node[1] | {namespace}
+            else:
+                node[1] = node[1] - {namespace}
+
+    def lookup(self, tree_number):
+        """ Return the frozenset of namespaces of tree_number. """
+        node = self.root
+        for c in tree_number:
+            child = node[0].get(c)
+            if child is None:
+                break
+            node = child
+        return node[1]
+
+
+TREE = TreeTrie(TREE_RULES)
+
+
+def route(ui, mns, sts=()):
+    """ Return the set of namespaces the MeSH record with unique identifier
+    ui, tree numbers mns and semantic types sts belongs to. """
+    namespaces = set()
+    for mn in mns:
+        namespaces |= TREE.lookup(mn)
+    if 'meshc' in namespaces or ui.startswith('C'):
+        # filter by semantic type for chemicals, but allow all non-typed
+        # terms in (and all descriptors)
+        if ui.startswith('D') or not sts or not CHEMICAL_TYPES.isdisjoint(sts):
+            namespaces.add('meshc')
+        else:
+            namespaces.discard('meshc')
+    return namespaces
@@ -0,0 +1,153 @@
+# coding: utf-8
+
+'''
+ ontology_cache.py
+
+ A cache of parsed ontologies. What a parser reads from an ontology (its
+ term records, and for OWL files the subClassOf edges and the
+ owl:Ontology header) is pickled under the SHA-256 digest of the source
+ file and the parser's cache_version, so an unchanged file is not parsed
+ again: not by a later run of gp_baseline.py (e.g. with -b 2), nor by
+ belanno.py.
+
+ By default the cache is kept next to the source file, in
+ ontology-cache/; when gp_baseline.py or belanno.py is run with --cache
+ DIR, in DIR/ontologies, shared by every working directory.
+
+ layout of the cache directory:
+   <parser>/<file>/<digest>-v<version>.pickle
+
+ An entry is one pickle or, for parsers whose records are streamed (see
+ OntologyCache.stream), a sequence of pickled batches of records ended by
+ a pickled None. Only the entry for the current content and parser
+ version of each file is kept. An entry that cannot be read back (a
+ truncated or corrupt file) is removed and the file parsed again.
+
+'''
+
+from source_cache import file_digest
+import os
+import pickle
+
+# errors raised by unpickling a truncated or corrupt entry
+CORRUPT = (pickle.UnpicklingError, EOFError, AttributeError, ImportError,
+           IndexError, KeyError, TypeError, ValueError)
+
+
+class OntologyCache(object):
+
+    ''' Cache of parsed ontologies kept in directory. get() returns the
+    cached result of parsing a source file, parsing it if needed. '''
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def entry_path(self, parser, version, source, digest):
+        """ Return the path the result of parser (by name) at version for
+        the content of source (by digest) is kept at. """
+        return os.path.join(self.directory, parser, os.path.basename(source),
+                            '{0}-v{1}.pickle'.format(digest, version))
+
+    def load(self, path):
+        """ Return the entry stored at path, or None. An entry that cannot
+        be read back is removed. """
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return None
+        with f:
+            try:
+                return pickle.load(f)
+            except CORRUPT as e:
+                self.discard(path, e)
+        return None
+
+    def discard(self, path, error):
+        """ Remove the corrupt entry at path. """
+        print('WARNING - corrupt ontology cache entry {0} ({1}); parsing '
+              'again'.format(path, error))
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def store(self, path, data, tmp=None):
+        """ Store data at path (or move the file tmp, already written, to
+        path), replacing the entries for other contents or versions of the
+        same file. """
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        if tmp is None:
+            tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+            with open(tmp, 'wb') as f:
+                pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        for name in os.listdir(directory):
+            if name.endswith('.pickle') and name != os.path.basename(path):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+    def stream(self, parser, version, source, records, batch_size=1000):
+        """ Yield the records parser (by name) at version reads from the
+        file source: from the cache if the content of source has been
+        parsed before, else from the iterable returned by records(). The
+        records are pickled in batches as they are yielded (and read back a
+        batch at a time), so neither path holds them all in memory. The
+        entry is only stored once all records have been read.
+
+        If the entry turns out to be corrupt part way through, it is
+        removed and source parsed again; the records already yielded from
+        the cache are skipped, so each record is yielded once. """
+        path = self.entry_path(parser, version, source, file_digest(source))
+        # number of records yielded from the cache
+        done = 0
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            f = None
+        if f is not None:
+            with f:
+                while True:
+                    try:
+                        batch = pickle.load(f)
+                        if batch is not None and type(batch) is not list:
+                            raise TypeError('not a batch of records')
+                    except CORRUPT as e:
+                        # includes an entry that ends without its None
+                        self.discard(path, e)
+                        break
+                    if batch is None:
+                        return
+                    yield from batch
+                    done += len(batch)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+        try:
+            with open(tmp, 'wb') as f:
+                batch = []
+                for i, record in enumerate(records()):
+                    batch.append(record)
+                    if i >= done:
+                        yield record
+                    if len(batch) == batch_size:
+                        pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+                        batch = []
+                pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(None, f, pickle.HIGHEST_PROTOCOL)
+            self.store(path, None, tmp)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def get(self, parser, version, source, build):
+        """ Return the result of parser (by name) at version for the file
+        source: from the cache if the content of source has been parsed
+        before, else by calling build(), whose result is then stored. """
+        path = self.entry_path(parser, version, source, file_digest(source))
+        data = self.load(path)
+        if data is None:
+            data = build()
+            self.store(path, data)
+        return data
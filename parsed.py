@@ -7,12 +7,22 @@
  This data can get very large, and it has been shown that this module
  alone is not sufficient to meet the memory needs of the program,
  specifically of the PubChem dataset, which is currently commented out.
- Consider replacing with DBM or another type of storage management.
+ The largest data objects (configuration.stored_data) can be kept on
+ disk instead, in SQLite databases - see use_store() and data_store.py.
 
 '''
 
 from datasets import *
 from configuration import *
+from constants import PARSER_TYPE, REFSEQ_STATUS_RANK
+from mesh_routing import route
+from data_store import SQLiteDict
+from records import EntrezInfoRecord, HistoryRecord, HGNCRecord, \
+    MGIRecord, RGDRecord, AffyRecord, Gene2AccRecord, interned
+import gc
+import os
+import parsers
+import pickle
 
 count = 0
 
@@ -21,336 +31,545 @@ swiss_withdrawn_acc_dict = {}
 
 swiss_withdrawn_acc_data = SwissWithdrawnData(swiss_withdrawn_acc_dict)
 
+# MeSH data, by namespace (see mesh_routing.py)
+mesh_dicts = {
+    'meshcs': meshcl_dict,
+    'meshd': meshd_dict,
+    'meshpp': meshpp_dict,
+    'meshc': meshc_dict,
+    'mesha': mesha_dict}
+
+# builds a record from the tuple of its values: the builders of the largest
+# data objects use it rather than calling the record type, and intern the
+# interned fields of the type themselves
+_new = tuple.__new__
+
+
+# record builders, by parser name (str(parser)); see builder()
+builders = {}
+
+
+def builder(*names):
+    """ Register the decorated function as the record builder of the
+    parsers named names. A builder is called as builder(entry,
+    data_object) for each record (entry) the parser yields, and adds it to
+    data_object (for parsers that feed several data objects, the list of
+    them). """
+    def register(function):
+        for name in names:
+            builders[name] = function
+        return function
+    return register
+
+
+# batch builders, by parser name; see batch_builder()
+batch_builders = {}
+
+
+def batch_builder(*names):
+    """ Register the decorated function as the batch builder of the parsers
+    named names: called as builder(entries, data_object) for each list of
+    records the parser's parse_batches() yields. Parsers without one are
+    built record by record (see get_batch_builder). """
+    def register(function):
+        for name in names:
+            batch_builders[name] = function
+        return function
+    return register
+
+
+# finishers, by parser name; see finisher()
+finishers = {}
+
+
+def finisher(*names):
+    """ Register the decorated function as the finisher of the parsers
+    named names: called as finisher(data_object) once parse_file has built
+    all the records of a file, for builders that hold some of them back
+    until then. """
+    def register(function):
+        for name in names:
+            finishers[name] = function
+        return function
+    return register
+
+
+def get_builder(parser):
+    """ Return the record builder of parser (a parser or its name), or
+    None if it has none. """
+    return builders.get(str(parser))
+
+
+def get_batch_builder(parser):
+    """ Return the batch builder of parser (a parser or its name): the one
+    registered for it, else one that runs its record builder on each
+    record of the batch. None if it has neither. """
+    build_batch = batch_builders.get(str(parser))
+    if build_batch is None:
+        build = get_builder(parser)
+        if build is None:
+            return None
+
+        def build_batch(entries, data_object):
+            for entry in entries:
+                build(entry, data_object)
+    return build_batch
+
+
+def build_batches(build, batches, data_object):
+    """ Run the batch builder build on each of batches, adding their
+    records to data_object. The cyclic garbage collector is paused while a
+    batch is built: record tuples, unlike the dictionaries of strings they
+    replaced, stay tracked by it, and its collections during a batch would
+    scan the records built so far again and again, although they hold no
+    cycles. """
+    for batch in batches:
+        paused = gc.isenabled()
+        gc.disable()
+        try:
+            build(batch, data_object)
+        finally:
+            if paused:
+                gc.enable()
 
-# entry passed to this function will be one row from
-# the file being parsed by its parser.
-def build_data(entry, parser, data_object):
 
-    if parser == 'NamespaceParser':
-        term_id = entry.get('ID')
-        data_object._dict[term_id] = {
-            'ALTIDS': entry.get('ALTIDS'),
-            'LABEL': entry.get('LABEL'),
-            'SYNONYMS': entry.get('SYNONYMS'),
-            'DESCRIPTION': entry.get('DESCRIPTION'),
-            'TYPE': entry.get('TYPE'),
-            'SPECIES': entry.get('SPECIES'),
-            'XREF': entry.get('XREF'),
-            'OBSOLETE': entry.get('OBSOLETE'),
-            'PARENTS': entry.get('PARENTS'),
-            'CHILDREN': entry.get('CHILDREN')}
-
-    if parser == 'EntrezGeneInfo_Parser':
-        gene_id = entry.get('GeneID')
-        type_of_gene = entry.get('type_of_gene')
-        description = entry.get('description')
-        tax_id = entry.get('tax_id')
-        official_symbol = entry.get('Symbol_from_nomenclature_authority')
-        synonyms = entry.get('Synonyms')
-        alternative_names = entry.get('Other_designations')
-        name = entry.get('Full_name_from_nomenclature_authority')
-        symbol = entry.get('Symbol')
-        description = entry.get('description')
-        dbXrefs = entry.get('dbXrefs')
-        data_object._dict[gene_id] = {
-            'dbXrefs': dbXrefs,
-            'type_of_gene': type_of_gene,
-            'description': description,
-            'tax_id': tax_id,
-            'Symbol_from_nomenclature_authority': official_symbol,
-            'Symbol': symbol,
-            'Synonyms': synonyms,
-            'Other_designations': alternative_names,
-            'Full_name_from_nomenclature_authority': name,
-            'description': description}
-
-    elif parser == 'EntrezGeneHistory_Parser':
-        gene_id = entry.get('GeneID')
-        discontinued_id = entry.get('Discontinued_GeneID')
-        new_id = None
-        if gene_id == '-':
-            status = 'withdrawn'
-        else:
-            status = 'retired'
-            new_id = gene_id
-
-        data_object._dict[discontinued_id] = {
-            'status': status,
-            'new_id': new_id
-        }
-
-    elif parser == 'Homologene_Parser':
-        gene_id = entry.get('GeneID')
-        tax_id = entry.get('tax_id')
-        hid = entry.get('HID')
-        # build dict to enable lookups by homologene group id OR gene ID
-        data_object._dict['gene_ids'] = data_object._dict.get('gene_ids', {})
-        data_object._dict['gene_ids'][gene_id] = {
-            'homologene_group': hid,
-            'tax_id': tax_id
-        }
-        data_object._dict['homologene_groups'] = data_object._dict.get(
-            'homologene_groups', {})
-        data_object._dict['homologene_groups'][
-            hid] = data_object._dict.get('homologene_groups').get(hid, {})
-        data_object._dict['homologene_groups'][hid][
-            tax_id] = data_object._dict.get(tax_id, set())
-        data_object._dict['homologene_groups'][hid][tax_id].add(gene_id)
-
-    elif parser == 'HGNC_Parser':
-        app_symb = entry.get('Approved Symbol')
-        loc_type = entry.get('Locus Type')
-        hgnc_id = entry.get('HGNC ID').replace('HGNC:', '')
-        old_symbols = entry.get('Previous Symbols')
-        old_names = entry.get('Previous Names')
-        synonyms = entry.get('Synonyms')
-        name_synonyms = entry.get('Name Synonyms')
-        name = entry.get('Approved Name')
-        mouse_ortholog = entry.get(
-            'Mouse Genome Database ID (supplied by MGI)')
-        rat_ortholog = entry.get('Rat Genome Database ID (supplied by RGD)')
-
-        data_object._dict[hgnc_id] = {
-            'Locus Type': loc_type,
-            'Symbol': app_symb,
-            'Previous Symbols': old_symbols,
-            'Previous Names': old_names,
-            'Synonyms': synonyms,
-            'Name Synonyms': name_synonyms,
-            'Approved Name': name,
-            'mouse_ortholog_id': mouse_ortholog,
-            'rat_ortholog_id': rat_ortholog}
-
-    elif parser == 'MGI_Parser':
-        m_symbol = entry.get('Marker Symbol')
-        feature_type = entry.get('Feature Type')
-        m_type = entry.get('Marker Type')
-        acc_id = entry.get('MGI Accession ID').replace('MGI:', '')
-        m_name = entry.get('Marker Name')
-        m_syn = entry.get('Marker Synonyms (pipe-separated)')
-
-        data_object._dict[acc_id] = {
-            'Feature Type': feature_type,
-            'Marker Type': m_type,
-            'Symbol': m_symbol,
-            'Marker Name': m_name,
-            'Marker Synonyms': m_syn}
-
-    elif parser == 'RGD_Parser':
-        gene_type = entry.get('GENE_TYPE')
-        name = entry.get('NAME')
-        symb = entry.get('SYMBOL')
-        rgd_id = entry.get('GENE_RGD_ID')
-        old_symbol = entry.get('OLD_SYMBOL')
-        old_name = entry.get('OLD_NAME')
-
-        data_object._dict[rgd_id] = {
-            'GENE_TYPE': gene_type,
-            'NAME': name,
-            'SYMBOL': symb,
-            'OLD_SYMBOL': old_symbol,
-            'OLD_NAME': old_name}
-
-    elif parser == 'SwissProt_Parser':
-        name = entry.get('name')
-        acc = entry.get('accessions')
-        primary_acc = acc[0]
-        gene_type = entry.get('type')
-        dbref = entry.get('dbreference')
-        alt_fullnames = entry.get('alternativeFullNames')
-        alt_shortnames = entry.get('alternativeShortNames')
-        rec_fullname = entry.get('recommendedFullName')
-        rec_shortname = entry.get('recommededShortName')
-        gene_name = entry.get('geneName')
-        gene_syn = entry.get('geneSynonyms')
-        tax_id = entry.get('NCBI Taxonomy')
-
-        data_object._dict[primary_acc] = {
-            'name': name,
-            'type': gene_type,
-            'accessions': acc,
-            'dbreference': dbref,
-            'alternativeFullNames': alt_fullnames,
-            'alternativeShortNames': alt_shortnames,
-            'recommendedFullName': rec_fullname,
-            'recommendedShortName': rec_shortname,
-            'geneName': gene_name,
-            'geneSynonym': gene_syn,
-            'tax_id': tax_id}
-
-    elif parser == 'Affy_Parser':
-        probe_id = entry.get('Probe Set ID')
-        entrez_gene = entry.get('Entrez Gene')
-        species = entry.get('Species Scientific Name')
-
-        data_object._dict[probe_id] = {
-            'Entrez Gene': entrez_gene,
-            'Species': species}
-
-    elif parser == 'Gene2Acc_Parser':
+def build_data(entry, parser, data_object):
+    """ Add entry, one record yielded by the parser named parser, to
+    data_object. parse_file looks the builder up once per file instead
+    (see get_builder). """
+    build = builders.get(parser)
+    if build is not None:
+        build(entry, data_object)
+
+
+@builder('NamespaceParser')
+def build_namespace(entry, data_object):
+    term_id = entry.get('ID')
+    data_object._dict[term_id] = {
+        'ALTIDS': entry.get('ALTIDS'),
+        'LABEL': entry.get('LABEL'),
+        'SYNONYMS': entry.get('SYNONYMS'),
+        'DESCRIPTION': entry.get('DESCRIPTION'),
+        'TYPE': entry.get('TYPE'),
+        'SPECIES': entry.get('SPECIES'),
+        'XREF': entry.get('XREF'),
+        'OBSOLETE': entry.get('OBSOLETE'),
+        'PARENTS': entry.get('PARENTS'),
+        'CHILDREN': entry.get('CHILDREN')}
+
+
+def entrez_info_record(entry):
+    get = entry.get
+    return _new(EntrezInfoRecord, (
+        get('dbXrefs'),
+        interned(get('type_of_gene')),
+        get('description'),
+        interned(get('tax_id')),
+        get('Symbol_from_nomenclature_authority'),
+        get('Symbol'),
+        get('Synonyms'),
+        get('Other_designations'),
+        get('Full_name_from_nomenclature_authority')))
+
+
+@builder('EntrezGeneInfo_Parser')
+def build_entrez_gene_info(entry, data_object):
+    data_object._dict[entry.get('GeneID')] = entrez_info_record(entry)
+
+
+@batch_builder('EntrezGeneInfo_Parser')
+def build_entrez_gene_info_batch(entries, data_object):
+    # gene_info is sorted by tax_id, so a tax_id is interned only when it
+    # changes
+    genes = data_object._dict
+    tax_id = None
+    for entry in entries:
+        get = entry.get
+        if get('tax_id') != tax_id:
+            tax_id = interned(get('tax_id'))
+        genes[get('GeneID')] = _new(EntrezInfoRecord, (
+            get('dbXrefs'),
+            interned(get('type_of_gene')),
+            get('description'),
+            tax_id,
+            get('Symbol_from_nomenclature_authority'),
+            get('Symbol'),
+            get('Synonyms'),
+            get('Other_designations'),
+            get('Full_name_from_nomenclature_authority')))
+
+
+@builder('EntrezGeneHistory_Parser')
+def build_entrez_gene_history(entry, data_object):
+    gene_id = entry.get('GeneID')
+    discontinued_id = entry.get('Discontinued_GeneID')
+    new_id = None
+    if gene_id == '-':
+        status = 'withdrawn'
+    else:
+        status = 'retired'
+        new_id = gene_id
+
+    data_object._dict[discontinued_id] = HistoryRecord(status, new_id)
+
+
+@builder('Homologene_Parser')
+def build_homologene(entry, data_object):
+    gene_id = entry.get('GeneID')
+    tax_id = entry.get('tax_id')
+    hid = entry.get('HID')
+    # build dict to enable lookups by homologene group id OR gene ID
+    data_object._dict['gene_ids'] = data_object._dict.get('gene_ids', {})
+    data_object._dict['gene_ids'][gene_id] = {
+        'homologene_group': hid,
+        'tax_id': tax_id
+    }
+    data_object._dict['homologene_groups'] = data_object._dict.get(
+        'homologene_groups', {})
+    data_object._dict['homologene_groups'][
+        hid] = data_object._dict.get('homologene_groups').get(hid, {})
+    data_object._dict['homologene_groups'][hid][
+        tax_id] = data_object._dict.get(tax_id, set())
+    data_object._dict['homologene_groups'][hid][tax_id].add(gene_id)
+
+
+@builder('HGNC_Parser')
+def build_hgnc(entry, data_object):
+    app_symb = entry.get('Approved Symbol')
+    loc_type = entry.get('Locus Type')
+    hgnc_id = entry.get('HGNC ID').replace('HGNC:', '')
+    old_symbols = entry.get('Previous Symbols')
+    old_names = entry.get('Previous Names')
+    synonyms = entry.get('Synonyms')
+    name_synonyms = entry.get('Name Synonyms')
+    name = entry.get('Approved Name')
+    mouse_ortholog = entry.get(
+        'Mouse Genome Database ID (supplied by MGI)')
+    rat_ortholog = entry.get('Rat Genome Database ID (supplied by RGD)')
+
+    data_object._dict[hgnc_id] = HGNCRecord(
+        loc_type, app_symb, old_symbols, old_names, synonyms, name_synonyms,
+        name, mouse_ortholog, rat_ortholog)
+
+
+@builder('MGI_Parser')
+def build_mgi(entry, data_object):
+    m_symbol = entry.get('Marker Symbol')
+    feature_type = entry.get('Feature Type')
+    m_type = entry.get('Marker Type')
+    acc_id = entry.get('MGI Accession ID').replace('MGI:', '')
+    m_name = entry.get('Marker Name')
+    m_syn = entry.get('Marker Synonyms (pipe-separated)')
+
+    data_object._dict[acc_id] = MGIRecord(
+        feature_type, m_type, m_symbol, m_name, m_syn)
+
+
+@builder('RGD_Parser')
+def build_rgd(entry, data_object):
+    gene_type = entry.get('GENE_TYPE')
+    name = entry.get('NAME')
+    symb = entry.get('SYMBOL')
+    rgd_id = entry.get('GENE_RGD_ID')
+    old_symbol = entry.get('OLD_SYMBOL')
+    old_name = entry.get('OLD_NAME')
+
+    data_object._dict[rgd_id] = RGDRecord(
+        gene_type, name, symb, old_symbol, old_name)
+
+
+@builder('SwissProt_Parser')
+def build_swissprot(entry, data_object):
+    name = entry.get('name')
+    acc = entry.get('accessions')
+    primary_acc = acc[0]
+    gene_type = entry.get('type')
+    dbref = entry.get('dbreference')
+    alt_fullnames = entry.get('alternativeFullNames')
+    alt_shortnames = entry.get('alternativeShortNames')
+    rec_fullname = entry.get('recommendedFullName')
+    rec_shortname = entry.get('recommededShortName')
+    gene_name = entry.get('geneName')
+    gene_syn = entry.get('geneSynonyms')
+    tax_id = entry.get('NCBI Taxonomy')
+
+    data_object._dict[primary_acc] = {
+        'name': name,
+        'type': gene_type,
+        'accessions': acc,
+        'dbreference': dbref,
+        'alternativeFullNames': alt_fullnames,
+        'alternativeShortNames': alt_shortnames,
+        'recommendedFullName': rec_fullname,
+        'recommendedShortName': rec_shortname,
+        'geneName': gene_name,
+        'geneSynonym': gene_syn,
+        'tax_id': tax_id}
+
+
+@builder('Affy_Parser')
+def build_affy(entry, data_object):
+    probe_id = entry.get('Probe Set ID')
+    entrez_gene = entry.get('Entrez Gene')
+    species = entry.get('Species Scientific Name')
+
+    data_object._dict[probe_id] = _new(
+        AffyRecord, (entrez_gene, interned(species)))
+
+
+@batch_builder('Affy_Parser')
+def build_affy_batch(entries, data_object):
+    # each annotation file is of one species
+    probes = data_object._dict
+    species = None
+    for entry in entries:
+        get = entry.get
+        if get('Species Scientific Name') != species:
+            species = interned(get('Species Scientific Name'))
+        probes[get('Probe Set ID')] = _new(
+            AffyRecord, (get('Entrez Gene'), species))
+
+
+@builder('Gene2Acc_Parser')
+def build_gene2acc(entry, data_object):
+    # gene2accession has a row per accession; keep one record per gene
+    # with the best RefSeq status seen so far
+    status = entry.get('status')
+    entrez_gene = entry.get('GeneID')
+    rank = REFSEQ_STATUS_RANK.get(status, len(REFSEQ_STATUS_RANK))
+    current = data_object._dict.get(entrez_gene)
+    if current is None or rank < REFSEQ_STATUS_RANK.get(
+            current['status'], len(REFSEQ_STATUS_RANK)):
+        data_object._dict[entrez_gene] = Gene2AccRecord(
+            status, entry.get('tax_id'), entrez_gene)
+
+
+@batch_builder('Gene2Acc_Parser')
+def build_gene2acc_batch(entries, data_object):
+    genes = data_object._dict
+    if type(genes) is not dict:
+        # a stored data object (see use_store) is not read row by row: the
+        # best record of each gene is kept in a plain dictionary until the
+        # file is read, then stored once (see finish_gene2acc)
+        genes = getattr(data_object, '_genes', None)
+        if genes is None:
+            genes = data_object._genes = dict(data_object._dict.items())
+    rank_of = REFSEQ_STATUS_RANK.get
+    unknown = len(REFSEQ_STATUS_RANK)
+    # the status of a record, read as a tuple item (the field lookup of
+    # Record.__getitem__ costs a Python call)
+    status_of = tuple.__getitem__
+    tax_id = None
+    for entry in entries:
         status = entry.get('status')
-        taxid = entry.get('tax_id')
         entrez_gene = entry.get('GeneID')
+        current = genes.get(entrez_gene)
+        if current is None or rank_of(status, unknown) < rank_of(
+                status_of(current, 0), unknown):
+            if entry.get('tax_id') != tax_id:
+                tax_id = interned(entry.get('tax_id'))
+            genes[entrez_gene] = _new(
+                Gene2AccRecord, (interned(status), tax_id, entrez_gene))
+
+
+@finisher('Gene2Acc_Parser')
+def finish_gene2acc(data_object):
+    genes = data_object.__dict__.pop('_genes', None)
+    if genes is not None:
+        data_object._dict.update(genes)
+
+
+@builder('CHEBI_Parser')
+def build_chebi(entry, data_object):
+    name = entry.get('name')
+    primary_id = entry.get('primary_id')
+    alt_ids = entry.get('alt_ids')
+    synonyms = entry.get('synonyms')
+
+    data_object._dict[primary_id] = {
+        'name': name,
+        'alt_ids': alt_ids,
+        'synonyms': synonyms}
+
+
+@builder('GO_Parser')
+def build_go(entry, data_object):
+    termid = entry.get('termid')
+    termname = entry.get('termname')
+    alt_ids = entry.get('altids')
+    syn = entry.get('synonyms')
+    namespace = entry.get('namespace')
+    is_obsolete = entry.get('is_obsolete')
+    is_complex = entry.get('complex')
+
+    if namespace == 'cellular_component':
+        gocc_dict[termid] = {
+            'termname': termname,
+            'alt_ids': alt_ids,
+            'synonyms': syn,
+            'complex': is_complex,
+            'is_obsolete': is_obsolete}
 
-        data_object._dict[entrez_gene] = {
-            'status': status,
-            'tax_id': taxid,
-            'entrez_gene': entrez_gene}
+    elif namespace == 'biological_process':
+        gobp_dict[termid] = {
+            'termname': termname,
+            'alt_ids': alt_ids,
+            'synonyms': syn,
+            'is_obsolete': is_obsolete}
 
-    elif parser == 'CHEBI_Parser':
-        name = entry.get('name')
-        primary_id = entry.get('primary_id')
-        alt_ids = entry.get('alt_ids')
-        synonyms = entry.get('synonyms')
 
-        data_object._dict[primary_id] = {
-            'name': name,
-            'alt_ids': alt_ids,
-            'synonyms': synonyms}
-
-    elif parser == 'GO_Parser':
-        termid = entry.get('termid')
-        termname = entry.get('termname')
-        alt_ids = entry.get('altids')
-        syn = entry.get('synonyms')
-        namespace = entry.get('namespace')
-        is_obsolete = entry.get('is_obsolete')
-        is_complex = entry.get('complex')
-
-        if namespace == 'cellular_component':
-            gocc_dict[termid] = {
-                'termname': termname,
-                'alt_ids': alt_ids,
-                'synonyms': syn,
-                'complex': is_complex,
-                'is_obsolete': is_obsolete}
-
-        elif namespace == 'biological_process':
-            gobp_dict[termid] = {
-                'termname': termname,
-                'alt_ids': alt_ids,
-                'synonyms': syn,
-                'is_obsolete': is_obsolete}
-
-    elif parser == 'MESH_Parser':
-        ui = entry.get('ui')
-        mh = entry.get('mesh_header')
-        mns = entry.get('mns')
-        sts = entry.get('sts')
-        synonyms = entry.get('synonyms')
-
-        mesh_dict = {}
-        mesh_dict['mesh_header'] = mh
-        mesh_dict['synonyms'] = synonyms
-
-        if any(branch.startswith('A11.284') for branch in mns):
-            meshcl_dict[ui] = mesh_dict
-
-        disease_branches = ('C', 'F03')
-        if any(branch.startswith(disease_branches) for branch in mns):
-            meshd_dict[ui] = mesh_dict
-
-        if any(branch.startswith('G') for branch in mns):
-            branches = {branch for branch in mns if branch.startswith('G')}
-            excluded = ('G01', 'G15', 'G17')
-            if not all(branch.startswith(excluded) for branch in branches):
-                meshpp_dict[ui] = mesh_dict
-
-        if any(branch.startswith('D') for branch in mns) or ui.startswith('C'):
-            # filter by semantic type for chemicals, but allow all non-typed terms in
-            # see http://semanticnetwork.nlm.nih.gov/SemGroups/SemGroups.txt
-            chemicals = (
-                'T116',
-                'T195',
-                'T123',
-                'T122',
-                'T118',
-                'T103',
-                'T120',
-                'T104',
-                'T200',
-                'T111',
-                'T196',
-                'T126',
-                'T131',
-                'T125',
-                'T129',
-                'T130',
-                'T197',
-                'T119',
-                'T124',
-                'T114',
-                'T109',
-                'T115',
-                'T121',
-                'T192',
-                'T110',
-                'T127')
-
-            if ui.startswith('D') or any(
-                    st in chemicals for st in sts) or len(sts) == 0:
-                meshc_dict[ui] = mesh_dict
-
-        if any(branch.startswith('A') for branch in mns):
-            excluded = ('A13', 'A18', 'A19', 'A20', 'A21')
-            branches = {branch for branch in mns if branch.startswith('A')}
-            if not all(branch.startswith(excluded) for branch in branches):
-                mesha_dict[ui] = mesh_dict
-
-    elif parser == 'SwissWithdrawn_Parser':
-        term_id = entry.get('accession')
+@builder('MESH_Parser')
+def build_mesh(entry, data_object):
+    ui = entry.get('ui')
+    mh = entry.get('mesh_header')
+    mns = entry.get('mns')
+    sts = entry.get('sts')
+    synonyms = entry.get('synonyms')
 
-        data_object._dict[term_id] = {
-            'status': 'withdrawn'
-        }
-
-    elif str(parser) == 'DO_Parser':
-        name = entry.get('name')
-        term_id = entry.get('id')
-        dbxrefs = entry.get('dbxrefs')
-        synonyms = entry.get('synonyms')
-        data_object._dict[term_id] = {
-            'name': name,
-            'dbxrefs': dbxrefs,
-            'synonyms': synonyms,
-            'alt_ids': entry.get('alt_ids'),
-            'is_obsolete': entry.get('is_obsolete')}
+    mesh_dict = {}
+    mesh_dict['mesh_header'] = mh
+    mesh_dict['synonyms'] = synonyms
 
-    elif parser == 'Owl_Parser':
-        term_id = entry.get('id')
-        prefix = data_object._prefix.upper()
-        term_type = entry.get('term_type')
-        if prefix == 'EFO' and term_type is None:
-            pass
-        elif term_id.startswith(prefix):
-            term_id = term_id.lstrip(prefix + '_')
-            term_id = term_id.lstrip(prefix + 'ID_')
-            data_object._dict[term_id] = {
-                'name': entry.get('name'),
-                'dbxrefs': entry.get('dbxrefs'),
-                'synonyms': entry.get('synonyms'),
-                'alt_ids': entry.get('alt_ids'),
-                'is_obsolete': entry.get('is_obsolete')}
-            if term_type:
-                data_object._dict[term_id]['term_type'] = term_type
-
-    elif parser == 'RGDOrthologParser':
-        term_id = entry.get('RAT_GENE_RGD_ID')
-        data_object._dict[term_id] = {
-            'symbol': entry.get('RAT_GENE_SYMBOL'),
-            'human_ortholog_id': entry.get('HUMAN_ORTHOLOG_HGNC_ID'),
-            'mouse_ortholog_id': entry.get('MOUSE_ORTHOLOG_MGI')}
+    for namespace in route(ui, mns, sts):
+        mesh_dicts[namespace][ui] = mesh_dict
 
-    elif parser == 'RGD_Obsolete_Parser':
-        term_id = entry.get('OLD_GENE_RGD_ID')
-        data_object._dict[term_id] = {
-            'status': entry.get('OLD_GENE_STATUS').lower(),
-            'new_id': entry.get('NEW_GENE_RGD_ID'),
-            'type': entry.get('OLD_GENE_TYPE')	}
 
-    elif parser == 'NCBI_Taxonomy_Parser':
-        term_id = entry.get('term_id')
+@builder('SwissWithdrawn_Parser')
+def build_swiss_withdrawn(entry, data_object):
+    term_id = entry.get('accession')
+
+    data_object._dict[term_id] = {
+        'status': 'withdrawn'
+    }
+
+
+@builder('Owl_Parser')
+def build_owl(entry, data_object):
+    term_id = entry.get('id')
+    prefix = data_object._prefix.upper()
+    term_type = entry.get('term_type')
+    if prefix == 'EFO' and term_type is None:
+        pass
+    elif term_id.startswith(prefix):
+        term_id = term_id.lstrip(prefix + '_')
+        term_id = term_id.lstrip(prefix + 'ID_')
         data_object._dict[term_id] = {
             'name': entry.get('name'),
-            'synonyms': entry.get('synonyms')}
-
+            'dbxrefs': entry.get('dbxrefs'),
+            'synonyms': entry.get('synonyms'),
+            'alt_ids': entry.get('alt_ids'),
+            'is_obsolete': entry.get('is_obsolete')}
+        if term_type:
+            data_object._dict[term_id]['term_type'] = term_type
+
+
+@builder('RGDOrthologParser')
+def build_rgd_ortholog(entry, data_object):
+    term_id = entry.get('RAT_GENE_RGD_ID')
+    data_object._dict[term_id] = {
+        'symbol': entry.get('RAT_GENE_SYMBOL'),
+        'human_ortholog_id': entry.get('HUMAN_ORTHOLOG_HGNC_ID'),
+        'mouse_ortholog_id': entry.get('MOUSE_ORTHOLOG_MGI')}
+
+
+@builder('RGD_Obsolete_Parser')
+def build_rgd_obsolete(entry, data_object):
+    term_id = entry.get('OLD_GENE_RGD_ID')
+    data_object._dict[term_id] = {
+        'status': entry.get('OLD_GENE_STATUS').lower(),
+        'new_id': entry.get('NEW_GENE_RGD_ID'),
+        'type': entry.get('OLD_GENE_TYPE')	}
+
+
+@builder('NCBI_Taxonomy_Parser')
+def build_ncbi_taxonomy(entry, data_object):
+    term_id = entry.get('term_id')
+    data_object._dict[term_id] = {
+        'name': entry.get('name'),
+        'synonyms': entry.get('synonyms')}
+
+
+def use_store(directory, cache_size=store_cache_size):
+    """ Keep the dictionaries of the data objects in stored_data in SQLite
+    databases in directory, emptied for a new Phase II, with cache_size
+    values of each kept in memory. """
+    os.makedirs(directory, exist_ok=True)
+    for data_object in stored_data:
+        store = SQLiteDict(
+            os.path.join(directory, str(data_object) + '.sqlite'), cache_size)
+        store.clear()
+        # not left open in the parent of the Phase II workers
+        store.close()
+        data_object._dict = store
+
+
+def parse_file(fn, pickle_suffix, verbose=False):
+    """ Parse datasets/<fn> with the parser configured for it in
+    baseline_data, build its data object(s) from the batches of records
+    the parser yields and pickle each of them as <object>.<pickle_suffix>.
+    Returns the list of data objects built. """
+    try:
+        data_tuple = baseline_data.get(fn)
+        data_object = data_tuple[2]
+        parser = data_tuple[PARSER_TYPE]('datasets/' + fn)
+        if verbose:
+            parser.is_verbose()
+            print('Running {0} on file {1}'.format(str(parser), fn))
+    except:
+        print('WARNING - skipping {0}; file not properly configured'.format(fn))
+        return []
+    build = get_batch_builder(parser)
+    if build is not None:
+        build_batches(build, parser.parse_batches(), data_object)
+        finish = finishers.get(str(parser))
+        if finish is not None:
+            finish(data_object)
+    # data_tuple[2] is either a single data object or a list of them
+    if isinstance(data_object, list):
+        objects = data_object
+    elif isinstance(data_object, DataSet):
+        objects = [data_object]
+    else:
+        objects = []
+    for o in objects:
+        o.source_file = fn
+        with open(str(o) + '.' + pickle_suffix, 'wb') as f:
+            pickle.dump(o, f, pickle.HIGHEST_PROTOCOL)
+    return objects
+
+
+def group_files(file_names):
+    """ Split file_names (keys of baseline_data) into groups that can be
+    parsed independently. Files that feed a common data object (e.g. the
+    MeSH descriptor and supplemental files, which both build meshc_data)
+    are put in one group, in baseline_data order, so they are merged the
+    same way as in a serial run. """
+    groups = []
+    for fn in file_names:
+        data_object = baseline_data[fn][2]
+        objects = data_object if isinstance(data_object, list) else [data_object]
+        ids = set(id(o) for o in objects)
+        merged = [g for g in groups if g[1] & ids]
+        group = ([fn], ids)
+        for g in merged:
+            groups.remove(g)
+            group = (g[0] + group[0], g[1] | group[1])
+        groups.append(group)
+    order = list(baseline_data)
+    return sorted((sorted(g[0], key=order.index) for g in groups),
+                  key=lambda g: order.index(g[0]))
+
+
+def parse_files(file_names, pickle_suffix, verbose=False):
+    """ Run parse_file on each of file_names in order; this is the task
+    run by each worker process of gp_baseline --jobs. Returns the names
+    (str(object)) of the data objects pickled, in order. """
+    # the --jobs workers already share the CPUs; a parser must not start
+    # a pool of its own in each of them
+    parsers.Parser.workers = 1
+    names = []
+    for fn in file_names:
+        for o in parse_file(fn, pickle_suffix, verbose):
+            if str(o) not in names:
+                names.append(str(o))
+    return names
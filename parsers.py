@@ -8,23 +8,47 @@
 
 '''
 
-from common import gzip_to_text
+from common import open_source, read_ncbi_tsv_batches, sniff_format
+from source_cache import SourceCache
+from ontology_cache import OntologyCache
+from hierarchy import HierarchyIndex, load_index, save_index
 from lxml import etree
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 import os
 import csv
-import gzip
+import urllib.parse
 import urllib.request
 import zipfile
 import io
+import itertools
+import mmap
+import pathlib
+import re
 from rdflib import URIRef, Namespace, Graph
-from rdflib.namespace import RDF, RDFS, OWL
-from rdflib.plugins import sparql
+from rdflib.namespace import RDF, RDFS, OWL, DC
+from rdflib.util import guess_format
 
 
 class Parser(object):
 
-    ''' Generic/parent parser. '''
+    ''' Generic/parent parser. Source files are opened with
+    common.open_source, so they may be stored compressed; text sources
+    are decoded with the parser's encoding.
+
+    Records are yielded one at a time by parse(), or in lists by
+    parse_batches(). By default parse_batches() groups the records of
+    parse() into lists of batch_size; parsers that read their source in
+    blocks yield a list per block instead, and define parse() from it
+    (see records).
+
+    Parsers that can hand blocks of their source to worker processes use
+    up to workers of them; 1, the default, parses in this process, and 0
+    uses one per CPU. '''
+
+    encoding = 'utf-8'
+    batch_size = 10000
+    workers = 1
 
     def __init__(self, url):
         self._url = url
@@ -34,11 +58,25 @@ class Parser(object):
         self.verbose = True
 
     def parse(self):
-        with open(self._url) as f:
+        with open_source(self._url, self.encoding) as f:
             reader = csv.DictReader(f, delimiter='\t')
             for row in reader:
                 yield row
 
+    def parse_batches(self):
+        """ Yield the records of the source in lists. """
+        records = iter(self.parse())
+        while True:
+            batch = list(itertools.islice(records, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def records(self):
+        """ Yield the records of parse_batches() one at a time; parse()
+        of the parsers that override parse_batches(). """
+        return itertools.chain.from_iterable(self.parse_batches())
+
     def __str__(self):
         return "Parser"
 
@@ -49,7 +87,7 @@ class RGDOrthologParser(Parser):
         super().__init__(url)
 
     def parse(self):
-        with open(self._url, 'r') as f:
+        with open_source(self._url, self.encoding) as f:
             reader = csv.DictReader(
                 filter(
                     lambda row: not row[0].startswith('#'),
@@ -71,7 +109,7 @@ class NamespaceParser(Parser):
         super().__init__(url)
 
     def parse(self):
-        with open(self._url, 'r') as f:
+        with open_source(self._url, self.encoding) as f:
             reader = csv.DictReader(
                 filter(
                     lambda row: not row[0].startswith('#'),
@@ -87,6 +125,8 @@ class NamespaceParser(Parser):
 
 class EntrezGeneInfoParser(Parser):
 
+    encoding = 'iso-8859-1'
+    tax_ids = ('9606', '10090', '10116')
     headers = ['tax_id', 'GeneID', 'Symbol', 'LocusTag',
                'Synonyms', 'dbXrefs', 'chromosome',
                'map_location', 'description',
@@ -100,13 +140,11 @@ class EntrezGeneInfoParser(Parser):
         super().__init__(url)
 
     def parse(self):
-        reader = csv.DictReader(gzip_to_text(self._url),
-                                delimiter='\t',
-                                fieldnames=self.headers)
+        return self.records()
 
-        for row in reader:
-            if row['tax_id'] in ('9606', '10090', '10116'):
-                yield row
+    def parse_batches(self):
+        return read_ncbi_tsv_batches(self._url, self.headers, self.tax_ids,
+                                     self.encoding)
 
     def __str__(self):
         return "EntrezGeneInfo_Parser"
@@ -114,6 +152,8 @@ class EntrezGeneInfoParser(Parser):
 
 class EntrezGeneHistoryParser(Parser):
 
+    encoding = 'iso-8859-1'
+    tax_ids = ('9606', '10090', '10116')
     headers = ["tax_id", "GeneID", "Discontinued_GeneID",
                "Discontinued_Symbol", "Discontinue_Date"]
 
@@ -121,13 +161,11 @@ class EntrezGeneHistoryParser(Parser):
         super().__init__(url)
 
     def parse(self):
-        reader = csv.DictReader(gzip_to_text(self._url),
-                                delimiter='\t',
-                                fieldnames=self.headers)
+        return self.records()
 
-        for row in reader:
-            if row['tax_id'] in ("9606", "10090", "10116"):
-                yield row
+    def parse_batches(self):
+        return read_ncbi_tsv_batches(self._url, self.headers, self.tax_ids,
+                                     self.encoding)
 
     def __str__(self):
         return "EntrezGeneHistory_Parser"
@@ -147,7 +185,7 @@ class HomologeneParser(Parser):
         super().__init__(url)
 
     def parse(self):
-        with open(self._url, "r") as f:
+        with open_source(self._url, self.encoding) as f:
             reader = csv.DictReader(f,
                                     delimiter='\t',
                                     fieldnames=self.headers)
@@ -162,23 +200,17 @@ class HomologeneParser(Parser):
 
 class HGNCParser(Parser):
 
+    # the source is downloaded gzipped; open_source handles either form
+    encoding = 'iso-8859-1'
+
     def __init__(self, url):
         super().__init__(url)
 
     def parse(self):
-
-        # use iso-8859-1 as default encoding.
-        try:
-            reader = csv.DictReader(gzip_to_text(self._url), delimiter='\t')
-        except:
-            reader = csv.DictReader(
-                open(
-                    self._url,
-                    "r",
-                    encoding="iso-8859-1"),
-                delimiter='\t')
-        for row in reader:
-            yield row
+        with open_source(self._url, self.encoding) as f:
+            reader = csv.DictReader(f, delimiter='\t')
+            for row in reader:
+                yield row
 
     def __str__(self):
         return "HGNC_Parser"
@@ -186,11 +218,13 @@ class HGNCParser(Parser):
 
 class MGIParser(Parser):
 
+    encoding = 'iso-8859-1'
+
     def __init__(self, url):
         super().__init__(url)
 
     def parse(self):
-        with open(self._url, "r", encoding='iso-8859-1') as f:
+        with open_source(self._url, self.encoding) as f:
             reader = csv.DictReader(f, delimiter='\t')
 
             for row in reader:
@@ -218,7 +252,7 @@ class RGDParser(Parser):
         super().__init__(url)
 
     def parse(self):
-        with open(self._url, "r") as f:
+        with open_source(self._url, self.encoding) as f:
             # skip all the comment lines beginning with '#' and also the
             # header.
             reader = csv.DictReader(filter(lambda row:
@@ -232,216 +266,393 @@ class RGDParser(Parser):
         return "RGD_Parser"
 
 
-class GeneTypeError(Exception):
-
-    ''' This class exists mainly as a way to break the iteration loop during parsing
-     of the SwissProt dataset if needed.'''
+# UniProt XML tags, used by SwissProtParser and its worker processes
+UNIPROT = '{http://uniprot.org/uniprot}'
+UNIPROT_ENTRY = UNIPROT + 'entry'
+
+# start of each <entry> element, and the NCBI taxonomy reference of its
+# organism, as found in the raw UniProt XML
+entry_start = re.compile(rb'<entry[\s>]')
+organism_taxon = re.compile(
+    rb'<organism[\s>].*?<dbReference type="NCBI Taxonomy" id="(\d+)"',
+    re.DOTALL)
+
+
+def swissprot_record(e, tax_ids):
+    """ Return the record (a dictionary) for the UniProt <entry> element e,
+    or None if e is not a Swiss-Prot entry for one of tax_ids. """
+    temp_dict = {}
+    n_dict = defaultdict(list)
+
+    # stop evaluating if this entry is not in the Swiss-Prot dataset
+    if e.get('dataset') != 'Swiss-Prot':
+        return None
+
+    # stop evaluating if this entry is not for human, mouse, or rat
+    org = e.find(UNIPROT + 'organism')
+    for org_child in org:
+        if org_child.tag == UNIPROT + 'dbReference':
+            # restrict by NCBI Taxonomy reference
+            if org_child.get('id') not in tax_ids:
+                return None
+            # add NCBI Taxonomy and the id for the entry to the dict
+            temp_dict[org_child.get('type')] = org_child.get('id')
+
+    # get entry name, add it to the dict
+    temp_dict['name'] = e.find(UNIPROT + 'name').text
+
+    # get protein data, add recommended full and short names to dict
+    protein = e.find(UNIPROT + 'protein')
+    for child in protein.find(UNIPROT + 'recommendedName'):
+        if child.tag == UNIPROT + 'fullName':
+            temp_dict['recommendedFullName'] = child.text
+        if child.tag == UNIPROT + 'shortName':
+            temp_dict['recommendedShortName'] = child.text
+    alt_shortnames = []
+    alt_fullnames = []
+    for altName in protein.findall(UNIPROT + 'alternativeName'):
+        for child in altName:
+            if child.tag == UNIPROT + 'fullName':
+                alt_fullnames.append(child.text)
+            if child.tag == UNIPROT + 'shortName':
+                alt_shortnames.append(child.text)
+    temp_dict['alternativeFullNames'] = alt_fullnames
+    temp_dict['alternativeShortNames'] = alt_shortnames
+
+    # get gene data, add primary names (symbols) and synonyms
+    gene = e.find(UNIPROT + 'gene')
+    if gene is not None:
+        gene_name = None
+        gene_synonyms = []
+        for name in gene.findall(UNIPROT + 'name'):
+            if name.get('type') == 'primary':
+                gene_name = name.text
+            elif name.get('type') == 'synonym':
+                gene_synonyms.append(name.text)
+        temp_dict['geneName'] = gene_name
+        temp_dict['geneSynonyms'] = gene_synonyms
+
+    # add the array of accessions to the dict
+    temp_dict['accessions'] = [
+        acc.text for acc in e.findall(UNIPROT + 'accession')]
+
+    # add dbReference type (human, rat, and mouse) and gene ids to the dict
+    type_set = ['GeneId', 'MGI', 'HGNC', 'RGD']
+    for dbr in e.findall(UNIPROT + 'dbReference'):
+        if dbr.get('type') in type_set:
+            n_dict[dbr.get('type')].append(dbr.get('id'))
+    temp_dict['dbreference'] = n_dict
+    return temp_dict
+
+
+def parse_swissprot_chunk(chunk, tax_ids):
+    """ Return the records of the <entry> elements in chunk, a complete
+    UniProt XML document. Runs in a worker process. """
+    root = etree.fromstring(chunk)
+    records = []
+    for e in root.iterchildren(UNIPROT_ENTRY):
+        record = swissprot_record(e, tax_ids)
+        if record is not None:
+            records.append(record)
+    return records
+
+
+def map_chunks(function, chunks, workers, *args):
+    """ Yield the list of records function(chunk, *args) returns for each
+    of chunks, in order. With more than one worker (0 for one per CPU)
+    the chunks are handed to worker processes, a bounded number at a
+    time. """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for chunk in chunks:
+            yield function(chunk, *args)
+        return
+    pending = deque()
+    with ProcessPoolExecutor(workers) as executor:
+        # keep a bounded number of chunks in flight; results are taken in
+        # submission order, i.e. file order
+        for chunk in chunks:
+            pending.append(executor.submit(function, chunk, *args))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
 
-    def __init__(self, value):
-        self.value = value
 
-    def __str__(self):
-        return repr(self.value)
+class SwissProtParser(Parser):
 
+    ''' Parses the UniProt XML for Swiss-Prot entries of human, mouse and
+    rat. The decompressed XML is split at <entry> boundaries into chunks
+    of about chunk_size bytes, and entries for other species are dropped
+    from the raw text before any tree is built. With more than one worker
+    (see Parser) the chunks are parsed by worker processes; records are
+    yielded in file order either way. '''
 
-class SwissProtParser(Parser):
+    chunk_size = 1 << 22
 
     def __init__(self, url):
         super().__init__(url)
-        self.entries = {}
-        self.accession_numbers = {}
-        self.gene_ids = {}
         self.tax_ids = {'9606', '10090', '10116'}
-        self.pro = '{http://uniprot.org/uniprot}protein'
-        self.rec_name = '{http://uniprot.org/uniprot}recommendedName'
-        self.full_name = '{http://uniprot.org/uniprot}fullName'
-        self.short_name = '{http://uniprot.org/uniprot}shortName'
-        self.alt_name = '{http://uniprot.org/uniprot}alternativeName'
-        self.db_ref = '{http://uniprot.org/uniprot}dbReference'
-        self.organism = '{http://uniprot.org/uniprot}organism'
-        self.entry = '{http://uniprot.org/uniprot}entry'
-        self.accession = '{http://uniprot.org/uniprot}accession'
-        self.name = '{http://uniprot.org/uniprot}name'
-        self.gene = '{http://uniprot.org/uniprot}gene'
+
+    def entries(self):
+        """ Yield the raw text of each <entry> element of the UniProt XML
+        whose organism is one of tax_ids, after the document header (the
+        text before the first entry). """
+        rest = b''
+        header = None
+        with open_source(self._url) as f:
+            for block in iter(lambda: f.read(self.chunk_size), b''):
+                data = rest + block
+                end = data.rfind(b'</entry>')
+                if end < 0:
+                    rest = data
+                    continue
+                end += len(b'</entry>')
+                starts = [m.start() for m in entry_start.finditer(data, 0, end)]
+                rest = data[end:]
+                if not starts:
+                    continue
+                if header is None:
+                    header = data[:starts[0]]
+                    yield header
+                starts.append(end)
+                for i, j in zip(starts, starts[1:]):
+                    m = organism_taxon.search(data, i, j)
+                    if m is None or m.group(1).decode() in self.tax_ids:
+                        yield data[i:j]
+
+    def chunks(self):
+        """ Yield UniProt XML documents of about chunk_size bytes, each
+        holding a run of consecutive entries from entries(). """
+        entries = self.entries()
+        header = next(entries, None)
+        if header is None:
+            return
+        batch, size = [], 0
+        for entry in entries:
+            batch.append(entry)
+            size += len(entry)
+            if size >= self.chunk_size:
+                yield header + b''.join(batch) + b'</uniprot>'
+                batch, size = [], 0
+        if batch:
+            yield header + b''.join(batch) + b'</uniprot>'
 
     def parse(self):
+        return self.records()
 
-        with gzip.open(self._url) as f:
-            ctx = etree.iterparse(f, tag=self.entry)
+    def parse_batches(self):
+        return map_chunks(parse_swissprot_chunk, self.chunks(), self.workers,
+                          self.tax_ids)
 
-            for ev, e in ctx:
-                temp_dict = {}
-                n_dict = defaultdict(list)
+    def __str__(self):
+        return 'SwissProt_Parser'
 
-                # stop evaluating if this entry is not in the Swiss-Prot
-                # dataset
-                if e.get('dataset') != 'Swiss-Prot':
-                    e.clear()
-                    continue
 
-                # stop evaluating if this entry is not for human, mouse, or rat
-                org = e.find(self.organism)
-
-                # use a custom exception to break to next iteration (e)
-                # if tax ref is not found.
-                try:
-                    for org_child in org:
-                        if org_child.tag == self.db_ref:
-                            # restrict by NCBI Taxonomy reference
-                            if org_child.get('id') not in self.tax_ids:
-                                e.clear()
-                                raise GeneTypeError(org_child.get('id'))
-                            else:
-                                # add NCBI Taxonomy and the id for the entry
-                                # to the dict
-                                temp_dict[org_child.get('type')] = \
-                                    org_child.get('id')
-                except GeneTypeError:
-                    continue
+# evidence tags ({ECO:...}) in UniProt flat file values
+evidence = re.compile(r'\s*\{[^}]*\}')
+# NCBI taxonomy of a UniProt flat file entry
+ox_taxon = re.compile(rb'^OX   NCBI_TaxID=(\d+)', re.MULTILINE)
 
-                # get entry name, add it to the dict
-                entry_name = e.find(self.name).text
-                temp_dict['name'] = entry_name
-
-                # get protein data, add recommended full and short names to
-                # dict
-                protein = e.find(self.pro)
-
-                for child in protein.find(self.rec_name):
-                    if child.tag == self.full_name:
-                        temp_dict['recommendedFullName'] = child.text
-                    if child.tag == self.short_name:
-                        temp_dict['recommendedShortName'] = child.text
-                alt_shortnames = []
-                alt_fullnames = []
-
-                protein = e.find(self.pro)
-                for altName in protein.findall(self.alt_name):
-                    for child in altName:
-                        if child.tag == self.full_name:
-                            alt_fullnames.append(child.text)
-                        if child.tag == self.short_name:
-                            alt_shortnames.append(child.text)
-
-                temp_dict['alternativeFullNames'] = alt_fullnames
-                temp_dict['alternativeShortNames'] = alt_shortnames
-
-                # get gene data, add primary names (symbols) and synonyms
-                gene = e.find(self.gene)
-                gene_synonyms = []
-                if gene is not None:
-                    for name in gene.findall(self.name):
-                        if name.get('type') == 'primary':
-                            gene_name = name.text
-                        elif name.get('type') == 'synonym':
-                            gene_synonyms.append(name.text)
-                    temp_dict['geneName'] = gene_name
-                    temp_dict['geneSynonyms'] = gene_synonyms
-
-                # get all accessions
-                entry_accessions = []
-                for entry_accession in e.findall(self.accession):
-                    acc = entry_accession.text
-                    entry_accessions.append(acc)
-                    if acc in self.accession_numbers:
-                        self.accession_numbers[acc] = None
-                    else:
-                        self.accession_numbers[acc] = 1
-
-                # add the array of accessions to the dict
-                temp_dict["accessions"] = entry_accessions
-
-                # add dbReference type (human, rat, and mouse) and gene ids to
-                # the dict
-                type_set = ['GeneId', 'MGI', 'HGNC', 'RGD']
-                for dbr in e.findall(self.db_ref):
-                    if dbr.get('type') in type_set:
-                        gene_id = dbr.get('id')
-                        n_dict[dbr.get('type')].append(gene_id)
-                temp_dict['dbreference'] = n_dict
 
-                # clear the tree before next iteration
-                e.clear()
-                while e.getprevious() is not None:
-                    del e.getparent()[0]
-                yield temp_dict
+class SwissProtDatParser(Parser):
 
-    def __str__(self):
-        return 'SwissProt_Parser'
+    ''' Parses the UniProt flat file (uniprot_sprot.dat.gz) for Swiss-Prot
+    entries of human, mouse and rat, giving the same records as
+    SwissProtParser reads from the XML. Only the ID, AC, DE, GN, OX and
+    DR lines are read; entries for other species are skipped on their
+    OX line before they are decoded. '''
 
+    block_size = 1 << 22
 
-# Helper function for AffyParser. This will save each of the downloaded
-# URLs and return the file pointer.
-def get_data(url):
-    # from url, download and save file
-    REQ = urllib.request.urlopen(url)
-    file_name = url.split('/')[-1]
-    os.chdir('datasets/')
-    with open(file_name, 'wb') as f:
-        f.write(REQ.read())
-    os.chdir('../')
-    return file_name
+    def __init__(self, url):
+        super().__init__(url)
+        self.tax_ids = {'9606', '10090', '10116'}
+
+    def entries(self):
+        """ Yield the raw text of each entry (up to its // line) whose
+        organism is one of tax_ids. """
+        rest = b''
+        with open_source(self._url) as f:
+            for block in iter(lambda: f.read(self.block_size), b''):
+                data = rest + block
+                entries = data.split(b'\n//\n')
+                rest = entries.pop()
+                for entry in entries:
+                    m = ox_taxon.search(entry)
+                    if m and m.group(1).decode() in self.tax_ids:
+                        yield entry
 
+    def parse(self):
+        for entry in self.entries():
+            record = self.record(entry.decode(self.encoding).split('\n'))
+            if record is not None:
+                yield record
+
+    def record(self, lines):
+        """ Return the record for the lines of one flat file entry, or None
+        if it is not a reviewed (Swiss-Prot) entry. """
+        temp_dict = {}
+        n_dict = defaultdict(list)
+        accessions = []
+        gene_lines = []
+        gene_done = False
+        names_done = False
+        section = None
+        alt_fullnames = []
+        alt_shortnames = []
+        type_set = ['GeneId', 'MGI', 'HGNC', 'RGD']
+        for line in lines:
+            code = line[:2]
+            value = line[5:]
+            if code == 'ID':
+                fields = value.split()
+                if fields[1] != 'Reviewed;':
+                    return None
+                name = fields[0]
+            elif code == 'AC':
+                accessions.extend(
+                    acc.strip() for acc in value.split(';') if acc.strip())
+            elif code == 'DE' and not names_done:
+                # names of the protein itself; Includes:/Contains: start the
+                # names of its domains and components
+                if value.startswith(('Includes:', 'Contains:')):
+                    names_done = True
+                    continue
+                if not value.startswith(' '):
+                    # RecName:, AltName:, SubName: or Flags: line
+                    section, sep, value = value.partition(':')
+                key, sep, text = value.strip().partition('=')
+                text = evidence.sub('', text).rstrip(';')
+                if section == 'RecName':
+                    if key == 'Full':
+                        temp_dict['recommendedFullName'] = text
+                    elif key == 'Short':
+                        temp_dict['recommendedShortName'] = text
+                elif section == 'AltName':
+                    # (Allergen=, CD_antigen=, INN= names are not kept)
+                    if key == 'Full':
+                        alt_fullnames.append(text)
+                    elif key == 'Short':
+                        alt_shortnames.append(text)
+            elif code == 'GN' and not gene_done:
+                # only the first gene, as in the XML (genes are separated
+                # by 'and' lines)
+                if value.strip() == 'and':
+                    gene_done = True
+                else:
+                    gene_lines.append(value)
+            elif code == 'OX':
+                taxon = evidence.sub('', value).split('=')[1].rstrip(';')
+                if taxon not in self.tax_ids:
+                    return None
+                temp_dict['NCBI Taxonomy'] = taxon
+            elif code == 'DR':
+                fields = value.split('; ')
+                if fields[0] in type_set:
+                    n_dict[fields[0]].append(fields[1].rstrip('.'))
+        temp_dict['name'] = name
+        temp_dict['alternativeFullNames'] = alt_fullnames
+        temp_dict['alternativeShortNames'] = alt_shortnames
+        if gene_lines:
+            gene_name = None
+            gene_synonyms = []
+            for item in evidence.sub('', ' '.join(gene_lines)).split(';'):
+                key, sep, text = item.strip().partition('=')
+                if key == 'Name':
+                    gene_name = text
+                elif key == 'Synonyms':
+                    gene_synonyms.extend(syn.strip() for syn in text.split(','))
+            temp_dict['geneName'] = gene_name
+            temp_dict['geneSynonyms'] = gene_synonyms
+        temp_dict['accessions'] = accessions
+        temp_dict['dbreference'] = n_dict
+        return temp_dict
 
+    def __str__(self):
+        return 'SwissProt_Parser'
+
+
+# Helper functions for AffyParser. read_affy_csv may run in worker
+# processes, so it is kept at module level.
 def filter_plus_print(row):
     return not row.startswith('#')
 
 
+# columns of the NetAffx annotation CSVs that are kept (see parsed.py)
+AFFY_COLUMNS = ('Probe Set ID', 'Entrez Gene', 'Species Scientific Name')
+
+
+def read_affy_csv(path, encoding='utf-8'):
+    """ Return the AFFY_COLUMNS of each row of the annotation CSV in the
+    zip archive at path, as a list of tuples. """
+    rows = []
+    with zipfile.ZipFile(path, 'r') as z:
+        # only want the .csv from the archive (also contains a .txt)
+        for name in z.namelist():
+            if '.csv' not in name:
+                continue
+            with io.TextIOWrapper(z.open(name), encoding=encoding) as f:
+                reader = csv.reader(filter(filter_plus_print, f))
+                header = next(reader, [])
+                columns = [header.index(c) for c in AFFY_COLUMNS]
+                last = max(columns)
+                for row in reader:
+                    if len(row) > last:
+                        rows.append(tuple(row[i] for i in columns))
+    return rows
+
+
 class AffyParser(Parser):
 
+    ''' Parses the NetAffx XML feed, then the annotation CSV of each array
+    in configuration.affy_array_names. The annotation archives are kept
+    in a SourceCache (cache_dir, by default next to the feed), so they
+    are only downloaded when they change upstream, and are parsed in
+    parallel when the parser has more than one worker (see Parser). '''
+
+    cache_dir = None
+
     def __init__(self, url):
         super().__init__(url)
+        self.cache = SourceCache(self.cache_dir or os.path.join(
+            os.path.dirname(self._url), 'source-cache'))
 
-    def parse(self):
-
+    def annotation_urls(self):
+        """ Return the URLs of the annotation CSVs listed in the feed. """
         from configuration import affy_array_names
         urls = []
-        with open(self._url, 'rb') as f:
-            ctx = etree.iterparse(f, events=('start', 'end'))
-
-            # This is probably not the best way to traverse this tree. Look at
-            # the lxml.etree API more closely for possible implementations when
-            # refactoring
-            # NOTES - put some debugging in here to see how this is parsing,
-            # may be a better way to parse (like using diff events).
-            for ev, e in ctx:
-                # iterate the Array elements
-                for n in e.findall('Array'):
-                    name = n.get('name')
-                    if name in affy_array_names:
-                        # iterate Annotation elements
-                        for child in n:
-                            if child.get('type') == 'Annot CSV':
-                                # iterate File elements
-                                for g_child in child:
-                                    # get the URL and add to the list
-                                    for gg_child in g_child:
-                                        urls.append(gg_child.text)
-
-        # iterate over the list of URLs returned from the Affy XML feed
-        for link in urls:
-            affy_reader = {}
-
-            # get_data() downloads the file, saves it as a .csv.zip, and
-            # returns a pointer to the file.
-            n = get_data(link)
-            z = zipfile.ZipFile('datasets/' + n, 'r')
-
-            # only want the .csv from the archive (also contains a .txt)
-            for name in z.namelist():
-                if '.csv' in name:
-                    if self.verbose:
-                        print('\tExtracting - ' + name)
-                    # wrap in a TextIOWrapper. otherwise it returns bytes.
-                    affy_reader = csv.DictReader(
-                        filter(
-                            lambda x: not x.startswith('#'),
-                            io.TextIOWrapper(
-                                z.open(name))),
-                        delimiter=',')
-
-                    for x in affy_reader:
-                        yield x
+        with open_source(self._url) as f:
+            for ev, e in etree.iterparse(f, tag='Array'):
+                if e.get('name') in affy_array_names:
+                    for annotation in e.iter('Annotation'):
+                        if annotation.get('type') == 'Annot CSV':
+                            # File elements, each holding the URL
+                            for f_elem in annotation:
+                                for u_elem in f_elem:
+                                    if u_elem.text not in urls:
+                                        urls.append(u_elem.text)
+                e.clear()
+        return urls
+
+    def parse(self):
+        return self.records()
+
+    def parse_batches(self):
+
+        urls = self.annotation_urls()
+        paths = self.cache.fetch_all(urls, verbose=self.verbose)
+        urls = [url for url in urls if url in paths]
+        results = map_chunks(read_affy_csv, [paths[url] for url in urls],
+                             self.workers, self.encoding)
+        # a batch per annotation file
+        for url, rows in zip(urls, results):
+            if self.verbose:
+                print('\tExtracting - ' + url.split('/')[-1])
+            yield [{'Probe Set ID': probe_id,
+                    'Entrez Gene': entrez_gene,
+                    'Species Scientific Name': species}
+                   for probe_id, entrez_gene, species in rows]
 
     def __str__(self):
         return 'Affy_Parser'
@@ -449,14 +660,19 @@ class AffyParser(Parser):
 
 class Gene2AccParser(Parser):
 
+    encoding = 'iso-8859-1'
+    tax_ids = ('9606', '10090', '10116')
+
     def __init__(self, url):
         super().__init__(url)
 
     def parse(self):
+        return self.records()
+
+    def parse_batches(self):
 
-        # would like to have DictReader handle this, but need a way to
-        # deal with the special case of the first value beginning with
-        # a hashtag. i.e. #Format: <-- is NOT a column header.
+        # the header line begins with a hashtag (#Format: ...), so the
+        # column names are given here; it is skipped by the tax_id filter.
         column_headers = ['tax_id', 'GeneID', 'status',
                           'RNA nucleotide accession.version',
                           'RNA nucleotide gi', 'protein accession.version',
@@ -468,12 +684,8 @@ class Gene2AccParser(Parser):
                           'mature peptide accession.version',
                           'mature peptide gi', 'Symbol']
 
-        g2a_reader = csv.DictReader(gzip_to_text(self._url), delimiter='\t',
-                                    fieldnames=column_headers)
-
-        for row in g2a_reader:
-            if row['tax_id'] in ('9606', '10090', '10116'):
-                yield row
+        return read_ncbi_tsv_batches(self._url, column_headers,
+                                     self.tax_ids, self.encoding)
 
     def __str__(self):
         return 'Gene2Acc_Parser'
@@ -556,11 +768,46 @@ class BELAnnotationsParser(Parser):
     def __str__(self):
         return 'BELAnnotations_Parser'
 
+class OntologyParser(Parser):
+
+    ''' Parent of the ontology parsers, whose results are kept in an
+    OntologyCache (see ontology_cache.py): in cache_dir if set, else next
+    to the source file. Bump cache_version when a parser's results
+    change, so older cache entries are not used. '''
+
+    cache_dir = None
+    cache_version = 1
+
+    def ontology_cache(self):
+        return OntologyCache(self.cache_dir or os.path.join(
+            os.path.dirname(self._url), 'ontology-cache'))
+
+    def cached(self, build):
+        """ Return the result of build() for the source file, from the
+        cache if the file has been parsed before. """
+        return self.ontology_cache().get(
+            str(self), self.cache_version, self._url, build)
+
+    def cached_records(self, records):
+        """ Yield the records of the iterable returned by records() for the
+        source file, from the cache if the file has been parsed before.
+        Records are read and stored a batch at a time (see
+        OntologyCache.stream). """
+        return self.ontology_cache().stream(
+            str(self), self.cache_version, self._url, records)
+
+
 # This one uses iterparse(), much faster than xpath on the
 # bigger .owl file.
 
 
-class CHEBIParser(Parser):
+class CHEBIParser(OntologyParser):
+
+    ''' Parses chebi.owl. Classes are streamed with iterparse and cleared
+    as they are read, so memory use does not grow with the ontology. '''
+
+    # 3: streamed cache entries end with a pickled None
+    cache_version = 3
 
     def __init__(self, url):
         super().__init__(url)
@@ -570,30 +817,37 @@ class CHEBIParser(Parser):
         self.synonym = '{http://purl.obolibrary.org/obo#}Synonym'
 
     def parse(self):
+        yield from self.cached_records(self.read)
+
+    def read(self):
 
-        with open(self._url, 'rb') as cf:
+        with open_source(self._url) as cf:
             tree = etree.iterparse(cf, tag=self.classy)
             for event, elem in tree:
                 if len(elem.values()) != 0:
-                    chebi_dict = {}
                     synonyms = set()
                     alt_ids = set()
                     name = ''
-                    vals = elem.values()
-                    chebi_dict['primary_id'] = vals[0].split('CHEBI_')[1]
-                    children = elem.getchildren()
-                    for child in children:
+                    for child in elem:
                         if child.tag == self.label:
                             name = child.text
-                        if child.tag == self.altId:
+                        elif child.tag == self.altId:
                             alt_ids.add(child.text.split(':')[1])
-                        if child.tag == self.synonym:
+                        elif child.tag == self.synonym:
                             synonyms.add(child.text)
-                        chebi_dict['name'] = name
-                        chebi_dict['alt_ids'] = alt_ids
-                        chebi_dict['synonyms'] = synonyms
 
-                    yield chebi_dict
+                    yield {'primary_id': elem.values()[0].split('CHEBI_')[1],
+                           'name': name,
+                           'alt_ids': alt_ids,
+                           'synonyms': synonyms}
+
+                # clear the tree before next iteration; classes nested in
+                # another element are removed with it
+                elem.clear()
+                root = elem.getparent()
+                if root is not None and root.getparent() is None:
+                    while elem.getprevious() is not None:
+                        del root[0]
 
     def __str__(self):
         return 'CHEBI_Parser'
@@ -601,134 +855,171 @@ class CHEBIParser(Parser):
 
 class GOParser(Parser):
 
+    ''' Parses the GO OBO-XML. Terms are streamed with iterparse and their
+    is_a edges are kept; once all terms have been read, the hierarchy is
+    indexed (see hierarchy.py, saved beside the pickles) and the terms that
+    are (or descend from) macromolecular complex are looked up in it. '''
+
+    complex_root = 'GO:0032991'
+
     def __init__(self, url):
         super().__init__(url)
 
     def parse(self):
 
-        # initialize empty dictionaries using tuple assignment
-        parents, accession_dict, term_dict = {}, {}, {}
-
-        # parse xml tree using lxml
-        parser = etree.XMLParser(ns_clean=True, recover=True, encoding='UTF-8')
-        root = etree.parse(self._url, parser)
-        terms = root.xpath("/obo/term")
-
-        # iterate the complex terms to build parent dictionary
-        for t in terms:
-            if t.find('namespace').text == 'cellular_component':
-                termid = t.find("id").text
-                parent_ids = [isa.text for isa in t.findall("is_a")]
-                parents[termid] = parent_ids
-
-        for t in terms:
-            is_obsolete = False
-            termid = t.find('id').text
-            termname = t.find('name').text
-            namespace = t.find('namespace').text
-            if t.find('is_obsolete') is not None:
-                is_obsolete = True
-            if t.findall('alt_id') is not None:
-                altids = [x.text for x in t.findall('alt_id')]
-            else:
-                altids = False
-
-            # identify complexes (for GOCC), based on parent terms
-            is_complex = False
-            if namespace == 'cellular_component':
-                parent_stack = parents[termid]
-                if termid == "GO:0032991":
-                    is_complex = True
-                elif t.find("is_root") is not None:
-                    is_complex = False
-                else:
-                    parent_stack.extend(parents[termid])
-                    while len(parent_stack) > 0:
-                        parent_id = parent_stack.pop()
-                        if parent_id == "GO:0032991":
-                            is_complex = True
-                            break
-                        if parent_id in parents:
-                            parent_stack.extend(parents[parent_id])
-
-            # strip 'GO:' from term_ids
-            termid = termid.replace('GO:', '')
-            altids = [altid.replace('GO:', '') for altid in altids]
+        terms = []
+        edges = []
 
-            # get synonyms - limited to scope='exact'
-            synonyms = []
-            for syn in t.findall('synonym'):
-                if syn.get('scope') == 'exact':
-                    synonyms.append(syn.find('synonym_text').text)
+        with open_source(self._url) as f:
+            ctx = etree.iterparse(f, tag='term', recover=True,
+                                  encoding='UTF-8')
+            for ev, t in ctx:
+                if t.getparent().tag != 'obo':
+                    continue
+                termid = t.findtext('id')
+                namespace = t.findtext('namespace')
+                for isa in t.iterfind('is_a'):
+                    edges.append((termid, isa.text))
+
+                # get synonyms - limited to scope='exact'
+                synonyms = [syn.findtext('synonym_text')
+                            for syn in t.iterfind('synonym')
+                            if syn.get('scope') == 'exact']
+
+                terms.append({
+                    'termid': termid,
+                    'termname': t.findtext('name'),
+                    'namespace': namespace,
+                    'altids': [x.text for x in t.iterfind('alt_id')],
+                    'complex': False,
+                    'synonyms': synonyms,
+                    'is_obsolete': t.find('is_obsolete') is not None})
 
-            yield {'termid': termid, 'termname': termname, 'namespace': namespace,
-                   'altids': altids, 'complex': is_complex, 'synonyms': synonyms,
-                   'is_obsolete': is_obsolete}
+                # clear the tree before next iteration
+                t.clear()
+                while t.getprevious() is not None:
+                    del t.getparent()[0]
+
+        index = load_index(self._url)
+        if index is None:
+            index = HierarchyIndex(edges, (term['termid'] for term in terms))
+            save_index(index, self._url)
+
+        # identify complexes (for GOCC): the complex root and its descendants
+        complexes = index.descendants(self.complex_root)
+        complexes.add(self.complex_root)
+
+        for term in terms:
+            if term['namespace'] == 'cellular_component':
+                term['complex'] = term['termid'] in complexes
+            # strip 'GO:' from term_ids
+            term['termid'] = term['termid'].replace('GO:', '')
+            term['altids'] = [altid.replace('GO:', '')
+                              for altid in term['altids']]
+            yield term
 
     def __str__(self):
         return 'GO_Parser'
 
 
+# the MeSH ASCII fields read by MESHParser: ui - unique identifier /
+# mh - mesh header / nm - name (for supplemental concepts) / mn - tree # /
+# st - semantic type / rn - registry number / entries and synonyms
+mesh_field = re.compile(
+    r'^[ \t]*(MH|NM|UI|MN|RN|ST|PRINT ENTRY|ENTRY|SY)[ \t]*=(.*)$', re.M)
+
+
+def mesh_record(text):
+    """ Return the record of one MeSH ASCII record, the text following its
+    *NEWRECORD line. """
+    ui = ''
+    mh = ''
+    mns = set()
+    sts = set()
+    rns = set()
+    synonyms = set()
+    for key, value in mesh_field.findall(text):
+        value = value.strip()
+        if key == 'MH' or key == 'NM':
+            mh = value
+        elif key == 'UI':
+            ui = value
+        elif key == 'MN':
+            mns.add(value)
+        elif key == 'RN':
+            rns.add(value)
+        elif key == 'ST':
+            sts.add(value)
+        elif '|EQV|' in value:
+            # the last field flags (with 'a') the leading fields that are
+            # synonyms
+            entries = value.split('|')
+            num_syns = entries[-1].count('a')
+            synonyms.update(s.strip() for s in entries[:num_syns])
+        elif '|' not in value:
+            synonyms.add(value)
+    return {'ui': ui, 'mesh_header': mh,
+            'mns': mns, 'sts': sts,
+            'synonyms': synonyms,
+            'rns': rns}
+
+
+def parse_mesh_block(block, encoding):
+    """ Return the records of block, a run of whole MeSH ASCII records.
+    Runs in a worker process. """
+    text = '\n' + block.decode(encoding)
+    # the text before the first *NEWRECORD (if any) is not a record
+    return [mesh_record(record)
+            for record in text.split('\n*NEWRECORD')[1:]]
+
+
 class MESHParser(Parser):
 
+    ''' Parses the MeSH ASCII descriptor (d*.bin) and supplementary concept
+    (c*.bin) files. The file is memory-mapped (or, if compressed, read in
+    blocks) and split at *NEWRECORD lines into blocks of about chunk_size
+    bytes. With more than one worker (see Parser) the blocks are parsed by
+    worker processes; records are yielded in file order either way. '''
+
+    encoding = 'iso-8859-1'
+    chunk_size = 1 << 22
+
     def __init__(self, url):
         super().__init__(url)
 
+    def blocks(self):
+        """ Yield blocks of about chunk_size bytes of the file, each
+        holding whole records. """
+        with open(self._url, 'rb') as f:
+            if sniff_format(f.read(8)) == 'plain' and \
+                    os.fstat(f.fileno()).st_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    start, size = 0, len(mm)
+                    while start < size:
+                        end = mm.find(b'\n*NEWRECORD', start + self.chunk_size)
+                        end = size if end < 0 else end + 1
+                        yield mm[start:end]
+                        start = end
+                return
+        rest = b''
+        with open_source(self._url) as f:
+            for block in iter(lambda: f.read(self.chunk_size), b''):
+                data = rest + block
+                end = data.rfind(b'\n*NEWRECORD')
+                if end < 0:
+                    rest = data
+                    continue
+                yield data[:end + 1]
+                rest = data[end + 1:]
+        if rest:
+            yield rest
+
     def parse(self):
+        return self.records()
 
-        # ui - unique identifier / mh - mesh header / nm - name (for supplemental concepts)
-        # mn - tree # / st - semantic type/ rn = registry number
-        ui = ''
-        mh = ''
-        mns = set()
-        sts = set()
-        rns = set()
-        synonyms = set()
-        firstTime = True
-        with open(self._url, "r", encoding="iso-8859-1") as fp:
-            # with open(self._url, 'r') as fp:
-            for line in fp.readlines():
-                values = line.split('=', maxsplit=1)
-                values = [value.strip() for value in values]
-                if values[0] == 'MH' or values[0] == 'NM':
-                    mh = values[1]
-                elif values[0] == 'UI':
-                    ui = values[1]
-                elif values[0] == 'MN':
-                    mns.add(values[1])
-                elif values[0] == 'RN':
-                    rns.add(values[1])
-                elif values[0] == 'ST':
-                    sts.add(values[1])
-                elif values[0] == 'PRINT ENTRY' or values[0] == 'ENTRY' or values[0] == 'SY':
-                    if '|EQV|' in values[1]:
-                        entries = values[1].split('|')
-                        last = entries[-1]
-                        num_syns = last.count('a')
-                        while num_syns > 0:
-                            num_syns = num_syns - 1
-                            s = entries[num_syns]
-                            synonyms.add(s.strip())
-                    else:
-                        if '|' not in values[1]:
-                            synonyms.add(values[1])
-                elif line.startswith('*NEWRECORD'):
-                    # file begins with *NEWRECORD so skip that one (dont yield)
-                    if firstTime:
-                        firstTime = False
-                        continue
-                    else:
-
-                        yield {'ui': ui, 'mesh_header': mh,
-                               'mns': mns, 'sts': sts,
-                               'synonyms': synonyms,
-                               'rns': rns}
-                        ui = ''
-                        mh = ''
-                        mns = set()
-                        sts = set()
-                        synonyms = set()
-                        rns = set()
+    def parse_batches(self):
+        return map_chunks(parse_mesh_block, self.blocks(), self.workers,
+                          self.encoding)
 
     def __str__(self):
         return 'MESH_Parser'
@@ -741,7 +1032,7 @@ class SwissWithdrawnParser(Parser):
 
     def parse(self):
 
-        with open(self._url, 'r') as fp:
+        with open_source(self._url, self.encoding) as fp:
             marker = False
             for line in fp.readlines():
                 if '____' in line:
@@ -763,7 +1054,7 @@ class MESHChangesParser(Parser):
 
     def parse(self):
 
-        with open(self._url, 'r') as fp:
+        with open_source(self._url, self.encoding) as fp:
             for line in fp.readlines():
                 if 'MH OLD =' in line:
                     mh_old = line.split('= ')[1]
@@ -785,76 +1076,303 @@ class MESHChangesParser(Parser):
         return 'MESHChanges_Parser'
 
 
-class OwlParser(Parser):
+OBO_IN_OWL = Namespace('http://www.geneontology.org/formats/oboInOwl#')
+
+
+def clark(uri):
+    """ Return the ElementTree name ('{namespace}local') of an RDF term. """
+    namespace, local = re.match(r'(.*[#/])(.*)$', uri).groups()
+    return '{{{0}}}{1}'.format(namespace, local)
+
+
+# RDF/XML syntax names (not RDF terms, so not in rdflib's RDF namespace)
+RDF_NS = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
+RDF_RDF, RDF_DESCRIPTION, RDF_ABOUT, RDF_ID, RDF_RESOURCE = (
+    clark(RDF_NS + name)
+    for name in ('RDF', 'Description', 'about', 'ID', 'resource'))
+RDF_TYPE = clark(RDF.type)
+XML_BASE = '{http://www.w3.org/XML/1998/namespace}base'
+OWL_CLASS = clark(OWL.Class)
+OWL_ONTOLOGY = clark(OWL.Ontology)
+OWL_VERSION_IRI = clark(OWL.versionIRI)
+OWL_VERSION_INFO = clark(OWL.versionInfo)
+OWL_DEPRECATED = clark(OWL.deprecated)
+RDFS_LABEL = clark(RDFS.label)
+RDFS_SUBCLASSOF = clark(RDFS.subClassOf)
+RDFS_COMMENT = clark(RDFS.comment)
+DC_DATE = clark(DC.date)
+OBO_XREF = clark(OBO_IN_OWL.hasDbXref)
+OBO_SYNONYM = clark(OBO_IN_OWL.hasExactSynonym)
+OBO_ALT_ID = clark(OBO_IN_OWL.hasAlternativeId)
+
+
+def graph_hierarchy(owl):
+    """ Return the rdfs:subClassOf edges between named classes of the
+    rdflib graph owl, and its classes, as strings. """
+    edges = [(str(s), str(o))
+             for s, o in owl.subject_objects(RDFS.subClassOf)
+             if isinstance(o, URIRef)]
+    return edges, [str(s) for s in owl.subjects(RDF.type, OWL.Class)]
+
+
+def owl_index(source, edges, nodes=()):
+    """ Return the hierarchy index of the (child, parent) subClassOf edges
+    between the classes nodes, read from the file source. The index is
+    saved beside the pickles and reused while source is unchanged. """
+    index = load_index(source)
+    # an index saved by an older parser may lack classes or edges read since
+    if index is not None and not (
+            all(node in index for node in nodes) and
+            all(parent in index.parents(child)
+                for child, parent in edges if child != parent)):
+        index = None
+    if index is None:
+        index = HierarchyIndex(edges, nodes)
+        save_index(index, source)
+    return index
+
+
+class OwlParser(OntologyParser):
+
+    ''' Parses OWL ontologies in RDF/XML. The classes (owl:Class elements,
+    or rdf:Descriptions typed owl:Class) are streamed with iterparse and
+    cleared as they are read, so the ontology is never held in memory as a
+    whole; files that describe no classes at the top level (or are not
+    RDF/XML) are read into an rdflib Graph instead. The results are cached
+    (see OntologyParser). '''
+
+    # 2: classes given as typed rdf:Descriptions
+    cache_version = 2
+
+    # classes are given a type if they are subClasses (at any depth) of the
+    # type's root class; currently only used to identify the EFO terms which
+    # are cell lines
+    # TODO - implement for other ontologies to assign type
+    type_dict = {
+        'http://www.ebi.ac.uk/efo/EFO_0000322': 'CellLine',
+        # 'http://purl.obolibrary.org/obo/DOID_4':'Disease',
+        # 'CLO_0000031':'CellLine',
+        # 'GO_0005623':'Cell',
+        # 'UBERON_0001062':'Anatomy'
+    }
 
     def __init__(self, url):
         super().__init__(url)
-        self.q = sparql.prepareQuery(
-            'ASK {?s rdfs:subClassOf+ ?class}',
-            initNs={'rdfs': RDFS}
-        )
 
     def parse(self):
-        oboInOwl = Namespace('http://www.geneontology.org/formats/oboInOwl#')
-        owl = Graph()
-        owl.parse(self._url)
-        for s in owl.subjects(RDF.type, OWL.Class):
-            term_dict = {}
-            pref_label = owl.label(s)
-            term_id = str(s).split('/')[-1]
-            dbxrefs = {str(x) for x in owl.objects(s, oboInOwl.hasDbXref)}
-            synonyms = {x for x in owl.objects(s, oboInOwl.hasExactSynonym)}
-            obsolete = owl.value(s, OWL.deprecated)
-            alt_ids = {
-                str(x) for x in owl.objects(
-                    s, oboInOwl.hasAlternativeId)}
-            term_type = self.check_elem_type(s, owl)
-            term_dict['name'] = pref_label
-            term_dict['id'] = term_id
-            term_dict['dbxrefs'] = dbxrefs
-            term_dict['synonyms'] = synonyms
-            term_dict['is_obsolete'] = obsolete
-            term_dict['alt_ids'] = alt_ids
+        yield from self.ontology()['terms']
+
+    def ontology(self):
+        """ Return the parsed ontology, as a dictionary of
+          terms     the term_dicts, as yielded by parse()
+          edges     the (child, parent) subClassOf edges between named
+                    classes, by URI
+          header    the owl:Ontology URI and its versionIRI, versionInfo,
+                    dc:date and rdfs:comments (see new_header) """
+        return self.cached(self.read)
+
+    def read(self):
+        try:
+            ontology = self.stream_classes()
+        except etree.XMLSyntaxError as e:
+            print('WARNING - {0} is not RDF/XML ({1}), '
+                  'parsing with rdflib'.format(self._url, e))
+            ontology = None
+        if ontology is None:
+            ontology = self.graph_classes()
+        terms, edges, header = ontology
+        term_types = self.term_types(edges, terms)
+        for uri, term_dict in terms.items():
+            term_type = term_types.get(uri)
             if term_type:
                 term_dict['term_type'] = term_type
-            yield term_dict
-
-    def check_elem_type(self, elem, owl):
-        # currently looks at parent term to identify the EFO terms which are cell lines
-        # TODO - implement for other ontologies to assign type
-        type_dict = {
-            'http://www.ebi.ac.uk/efo/EFO_0000322': 'CellLine',
-            # 'http://purl.obolibrary.org/obo/DOID_4':'Disease',
-            # 'CLO_0000031':'CellLine',
-            # 'GO_0005623':'Cell',
-            # 'UBERON_0001062':'Anatomy'
-        }
-
-        def check_parent(term, parent):
-            '''Given a term URIRef, returns True if the term is a subClass of the
-            given parent.'''
-            parent = URIRef(parent)
-            if [row for row in owl.query(self.q, initBindings={'s': term, 'class': parent})][
-                    0]:
+        return {'terms': list(terms.values()), 'edges': edges,
+                'header': header}
+
+    @staticmethod
+    def new_term(uri):
+        return {'name': '', 'id': uri.split('/')[-1], 'dbxrefs': set(),
+                'synonyms': set(), 'is_obsolete': None, 'alt_ids': set()}
+
+    @staticmethod
+    def new_header(uri=None):
+        return {'uri': uri, 'version_iri': None, 'version_info': None,
+                'date': None, 'comments': []}
+
+    def stream_classes(self):
+        """ Read the named classes of the ontology with iterparse. Returns
+        a dictionary of class URI -> term_dict, in document order, the
+        subClassOf edges between named classes and the ontology header;
+        or None if the file describes no classes at the top level. A class
+        is an owl:Class element or an rdf:Description with an rdf:type of
+        owl:Class; a class described in more than one element (typed or
+        not) is merged, as in a graph. """
+        # every subject described at the top level; the classes are kept
+        described = {}
+        classes = set()
+        edges = []
+        header = self.new_header()
+        file_uri = pathlib.Path(self._url).resolve().as_uri()
+        with open_source(self._url) as f:
+            for ev, e in etree.iterparse(
+                    f, tag=(OWL_CLASS, OWL_ONTOLOGY, RDF_DESCRIPTION),
+                    huge_tree=True):
+                root = e.getparent()
+                if root is None or root.tag != RDF_RDF:
+                    # nested; read with the enclosing element
+                    continue
+                base = root.get(XML_BASE, file_uri)
+                if self.has_type(e, base, OWL_ONTOLOGY, OWL.Ontology):
+                    self.read_header(e, base, header)
+                else:
+                    uri = self.class_uri(e, base)
+                    if uri is not None:
+                        if self.has_type(e, base, OWL_CLASS, OWL.Class):
+                            classes.add(uri)
+                        term = described.get(uri)
+                        if term is None:
+                            term = described[uri] = self.new_term(uri)
+                        self.read_class(e, uri, base, term, edges)
+                    for c in e.iterdescendants(OWL_CLASS, RDF_DESCRIPTION):
+                        nested = self.class_uri(c, base)
+                        if (nested is not None and
+                                self.has_type(c, base, OWL_CLASS, OWL.Class)):
+                            classes.add(nested)
+                            if nested not in described:
+                                described[nested] = self.new_term(nested)
+
+                # clear the tree before next iteration
+                e.clear()
+                while e.getprevious() is not None:
+                    del root[0]
+        terms = dict((uri, term) for uri, term in described.items()
+                     if uri in classes)
+        if not terms:
+            return None
+        return terms, edges, header
+
+    @staticmethod
+    def has_type(e, base, tag, rdf_type):
+        """ True if the element e is of the type rdf_type, whose element
+        name is tag: as a typed node (<owl:Class>) or with an rdf:type
+        property (<rdf:Description><rdf:type rdf:resource="..#Class"/>). """
+        if e.tag == tag:
+            return True
+        for child in e:
+            if (child.tag == RDF_TYPE and urllib.parse.urljoin(
+                    base, child.get(RDF_RESOURCE, '')) == str(rdf_type)):
                 return True
-            else:
-                return False
-
-        types = set()
-
-        # for k,v in type_dict.items():
-        #    k = URIRef(k)
-        # ASK query to determine if elem is a subClass of the Class k (corresponding to type v)
-        # if [r for r in owl.query(self.q, initBindings={'s':elem,
-        # 'class':k})][0]:
-        for k, v in type_dict.items():
-            if check_parent(elem, k):
-                types.add(v)
-
-        if len(types) > 0:
-            return types
-        else:
+        return False
+
+    @staticmethod
+    def class_uri(e, base):
+        about = e.get(RDF_ABOUT)
+        if about is None and e.get(RDF_ID) is not None:
+            about = '#' + e.get(RDF_ID)
+        if about is None:
+            # anonymous class
             return None
+        return urllib.parse.urljoin(base, about)
+
+    def read_header(self, e, base, header):
+        """ Fill header from the owl:Ontology element e. """
+        header['uri'] = self.class_uri(e, base)
+        for child in e:
+            if child.tag == OWL_VERSION_IRI:
+                header['version_iri'] = urllib.parse.urljoin(
+                    base, child.get(RDF_RESOURCE, ''))
+            elif child.tag == OWL_VERSION_INFO:
+                header['version_info'] = child.text or ''
+            elif child.tag == DC_DATE:
+                header['date'] = child.text or ''
+            elif child.tag == RDFS_COMMENT:
+                header['comments'].append(child.text or '')
+
+    @staticmethod
+    def read_class(e, uri, base, term, edges):
+        """ Add the properties of the owl:Class element e to term, and its
+        named superclasses to edges. """
+        for child in e:
+            tag = child.tag
+            resource = child.get(RDF_RESOURCE)
+            if resource is not None:
+                value = urllib.parse.urljoin(base, resource)
+            else:
+                value = child.text or ''
+            if tag == RDFS_LABEL:
+                if not term['name']:
+                    term['name'] = value
+            elif tag == OBO_XREF:
+                term['dbxrefs'].add(value)
+            elif tag == OBO_SYNONYM:
+                term['synonyms'].add(value)
+            elif tag == OBO_ALT_ID:
+                term['alt_ids'].add(value)
+            elif tag == OWL_DEPRECATED:
+                term['is_obsolete'] = value.strip() in ('true', '1')
+            elif tag == RDFS_SUBCLASSOF:
+                if resource is None and len(child):
+                    # <rdfs:subClassOf><owl:Class rdf:about=".."/>
+                    resource = child[0].get(RDF_ABOUT)
+                    if resource is not None:
+                        value = urllib.parse.urljoin(base, resource)
+                if resource is not None:
+                    edges.append((uri, value))
+
+    def graph_classes(self):
+        """ Read the classes of the ontology from an rdflib Graph, for
+        serializations stream_classes cannot read. Returns the same as
+        stream_classes. """
+        owl = Graph()
+        name = re.sub(r'\.gz$', '', self._url)
+        with open_source(self._url) as f:
+            # resolve relative IRIs against the file, as rdflib does when
+            # given a path
+            owl.parse(f, format=guess_format(name) or 'xml',
+                      publicID=pathlib.Path(self._url).resolve().as_uri())
+        terms = {}
+        for s in owl.subjects(RDF.type, OWL.Class):
+            term = terms[str(s)] = self.new_term(str(s))
+            # plain strings and bools, as stream_classes gives
+            term['name'] = str(owl.value(s, RDFS.label, default=''))
+            term['dbxrefs'] = {
+                str(x) for x in owl.objects(s, OBO_IN_OWL.hasDbXref)}
+            term['synonyms'] = {
+                str(x) for x in owl.objects(s, OBO_IN_OWL.hasExactSynonym)}
+            deprecated = owl.value(s, OWL.deprecated)
+            if deprecated is not None:
+                term['is_obsolete'] = str(deprecated).strip() in ('true', '1')
+            term['alt_ids'] = {
+                str(x) for x in owl.objects(s, OBO_IN_OWL.hasAlternativeId)}
+        header = self.new_header()
+        for ontology in owl.subjects(RDF.type, OWL.Ontology):
+            header = self.new_header(str(ontology))
+            for key, predicate in (('version_iri', OWL.versionIRI),
+                                   ('version_info', OWL.versionInfo),
+                                   ('date', DC.date)):
+                value = owl.value(ontology, predicate)
+                if value is not None:
+                    header[key] = str(value)
+            header['comments'] = [
+                str(o) for o in owl.objects(ontology, RDFS.comment)]
+            break
+        return terms, graph_hierarchy(owl)[0], header
+
+    def term_types(self, edges, classes):
+        """ Return a dictionary mapping the URI of each typed class to its
+        set of types (see type_dict). The subClasses of each type root are
+        found with one traversal of the hierarchy index; nothing is
+        computed for ontologies in which no type root has subClasses. """
+        parents = set(parent for child, parent in edges)
+        roots = [root for root in self.type_dict if root in parents]
+        term_types = defaultdict(set)
+        if not roots:
+            return term_types
+        index = owl_index(self._url, edges, classes)
+        for root in roots:
+            for term in index.descendants(root):
+                term_types[term].add(self.type_dict[root])
+        return term_types
 
     def __str__(self):
         return 'Owl_Parser'
@@ -867,7 +1385,7 @@ class RGDObsoleteParser(Parser):
 
     def parse(self):
 
-        with open(self._url, 'r') as rgdo:
+        with open_source(self._url, self.encoding) as rgdo:
             # skip comment lines
             rgd_csvr = csv.DictReader(filter(lambda row:
                                              not row[0].startswith('#'), rgdo),
@@ -886,7 +1404,7 @@ class NCBITaxonomyParser(Parser):
         super().__init__(url)
 
     def parse(self):
-        with open(self._url, 'r') as f:
+        with open_source(self._url, self.encoding) as f:
             term_id, pref_label, synonyms = None, None, set()
             for line in iter(f):
                 values = line.split('|')
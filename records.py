@@ -0,0 +1,125 @@
+# coding: utf-8
+
+'''
+ records.py
+
+ Compact record types for the values of the larger DataSet dictionaries
+ (see parsed.py). A record is a tuple of its values, in the order of its
+ type's fields, with no per-record dictionary of keys; it is read like
+ the dictionary it replaces (record['Symbol'], record.get('Symbol')).
+ Values of low-cardinality fields (tax ids, gene types, statuses) are
+ interned, so all records share one string object per distinct value,
+ in memory and in the pickled data objects.
+
+'''
+
+import sys
+
+
+def interned(value):
+    """ Return the interned copy of value if it is a string, else value. """
+    return sys.intern(value) if type(value) is str else value
+
+
+class Record(tuple):
+
+    ''' Base of the record types. Subclasses list their fields, and the
+    fields whose (string) values are interned. '''
+
+    __slots__ = ()
+    fields = ()
+    interned = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._index = dict((field, i) for i, field in enumerate(cls.fields))
+        # __new__ is compiled for each record type, as for a namedtuple, so
+        # building a record costs about as much as building a tuple
+        args = ['_{0}'.format(i) for i in range(len(cls.fields))]
+        values = [
+            '_intern({0}) if type({0}) is str else {0}'.format(arg)
+            if field in cls.interned else arg
+            for arg, field in zip(args, cls.fields)]
+        namespace = {'_intern': sys.intern, '_new': tuple.__new__}
+        exec('def __new__(_cls, {0}): return _new(_cls, ({1},))'.format(
+            ', '.join(args), ', '.join(values)), namespace)
+        cls.__new__ = namespace['__new__']
+
+    def __getnewargs__(self):
+        return tuple(self)
+
+    def __getitem__(self, key):
+        if type(key) is str:
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        """ Return the value of field key, or default if there is no such
+        field. """
+        i = self._index.get(key)
+        if i is None:
+            return default
+        return tuple.__getitem__(self, i)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def keys(self):
+        return self.fields
+
+    def values(self):
+        return tuple(self)
+
+    def items(self):
+        return tuple(zip(self.fields, self))
+
+    def __repr__(self):
+        return '{0}({1})'.format(type(self).__name__, ', '.join(
+            '{0}={1!r}'.format(k, v) for k, v in self.items()))
+
+
+class EntrezInfoRecord(Record):
+    __slots__ = ()
+    fields = ('dbXrefs', 'type_of_gene', 'description', 'tax_id',
+              'Symbol_from_nomenclature_authority', 'Symbol', 'Synonyms',
+              'Other_designations', 'Full_name_from_nomenclature_authority')
+    interned = ('type_of_gene', 'tax_id')
+
+
+class HistoryRecord(Record):
+    __slots__ = ()
+    fields = ('status', 'new_id')
+    interned = ('status',)
+
+
+class HGNCRecord(Record):
+    __slots__ = ()
+    fields = ('Locus Type', 'Symbol', 'Previous Symbols', 'Previous Names',
+              'Synonyms', 'Name Synonyms', 'Approved Name',
+              'mouse_ortholog_id', 'rat_ortholog_id')
+    interned = ('Locus Type',)
+
+
+class MGIRecord(Record):
+    __slots__ = ()
+    fields = ('Feature Type', 'Marker Type', 'Symbol', 'Marker Name',
+              'Marker Synonyms')
+    interned = ('Feature Type', 'Marker Type')
+
+
+class RGDRecord(Record):
+    __slots__ = ()
+    fields = ('GENE_TYPE', 'NAME', 'SYMBOL', 'OLD_SYMBOL', 'OLD_NAME')
+    interned = ('GENE_TYPE',)
+
+
+class AffyRecord(Record):
+    __slots__ = ()
+    fields = ('Entrez Gene', 'Species')
+    interned = ('Species',)
+
+
+class Gene2AccRecord(Record):
+    __slots__ = ()
+    fields = ('status', 'tax_id', 'entrez_gene')
+    interned = ('status', 'tax_id')
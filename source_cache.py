@@ -0,0 +1,225 @@
+# coding: utf-8
+
+'''
+ source_cache.py
+
+ A content-addressed cache of downloaded source files. Each URL is
+ downloaded conditionally into a staging area, so an unchanged upstream
+ file is not fetched again. Its content is then stored under its
+ SHA-256 digest, and URLs that serve identical content share one copy.
+
+ The cache is used for the Affymetrix annotation archives listed in the
+ NetAffx feed (by default in datasets/source-cache), and, when
+ gp_baseline.py is run with --cache DIR, as a cache shared by every
+ working directory and run on the machine. Files are then reflinked or
+ hardlinked from the cache into datasets/ (copied if neither is
+ possible), together with their .info files. Concurrent runs
+ coordinate with file locks, so each file is downloaded only once.
+
+ layout of the cache directory:
+   index.json              url -> digest and file name
+   staging/<key>/<file>    last download of each url (with .info file)
+   objects/<xx>/<digest>   content, by digest
+   locks/<key>.lock        lock files
+
+'''
+
+from common import download, download_all, read_info
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import threading
+import urllib.parse
+
+try:
+    import fcntl
+except ImportError:
+    # no file locking (e.g. Windows); the cache is then only safe for
+    # one run at a time
+    fcntl = None
+
+# ioctl request to clone a file (reflink) on Linux (btrfs, xfs)
+FICLONE = 0x40049409
+
+
+def file_digest(fileName):
+    """ Return the SHA-256 hex digest of the content of fileName. """
+    h = hashlib.sha256()
+    with open(fileName, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _reflink(src, dst):
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+
+def link_or_copy(src, dst):
+    """ Make dst a copy of src, as cheaply as the file system allows: a
+    reflink (copy-on-write clone) if supported, else a hardlink, else a
+    copy. dst is replaced atomically. """
+    tmp = dst + '.tmp'
+    for make in (_reflink, os.link, shutil.copyfile):
+        if make is _reflink and fcntl is None:
+            continue
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        try:
+            make(src, tmp)
+            break
+        except OSError:
+            if make is shutil.copyfile:
+                raise
+    os.replace(tmp, dst)
+
+
+def copy_info(src, dst):
+    """ Copy the .info file of src to dst, keeping the recorded URL,
+    validators and download time so get_citation_info reports the same
+    version and date for both. """
+    with open(src + '.info') as f:
+        lines = f.readlines()
+    with open(dst + '.info.tmp', 'w') as f:
+        for line in lines:
+            if line.startswith('Filename: '):
+                line = 'Filename: ' + dst + '\n'
+            f.write(line)
+    os.replace(dst + '.info.tmp', dst + '.info')
+
+
+class SourceCache(object):
+
+    ''' Content-addressed cache of downloaded source files kept in
+    directory. fetch() brings a URL up to date in the cache, install()
+    places its content at a path outside the cache, and fetch_all()
+    fetches a list of URLs concurrently. '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._index_file = os.path.join(directory, 'index.json')
+        self._index = {}
+        self._mutex = threading.Lock()
+        for d in ('staging', 'objects', 'locks'):
+            os.makedirs(os.path.join(directory, d), exist_ok=True)
+        self._read_index()
+
+    def _key(self, url):
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    @contextlib.contextmanager
+    def lock(self, name):
+        """ Hold an exclusive lock on name, shared with other processes
+        using the same cache directory. """
+        path = os.path.join(self.directory, 'locks', name + '.lock')
+        with open(path, 'a') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_index(self):
+        if os.path.exists(self._index_file):
+            with open(self._index_file) as f:
+                self._index = json.load(f)
+
+    def staging_path(self, url):
+        """ Return the path the latest download of url is kept at. """
+        key = self._key(url)
+        name = os.path.basename(urllib.parse.urlsplit(url).path) or key
+        return os.path.join(self.directory, 'staging', key, name)
+
+    def object_path(self, digest):
+        """ Return the path of the content with the given digest. """
+        return os.path.join(self.directory, 'objects', digest[:2], digest)
+
+    def lookup(self, url):
+        """ Return the path of the cached content of url, or None. """
+        with self._mutex:
+            digest = self._index.get(url, {}).get('sha256')
+        if digest and os.path.exists(self.object_path(digest)):
+            return self.object_path(digest)
+        return None
+
+    def store(self, url, fileName):
+        """ Add the content of fileName to the cache as the current
+        content of url, and return the path of the cached object. """
+        digest = file_digest(fileName)
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            link_or_copy(fileName, path)
+        with self._mutex, self.lock('index'):
+            # merge with the entries written by other runs
+            self._read_index()
+            self._index[url] = {
+                'sha256': digest,
+                'file': os.path.basename(fileName)}
+            tmp = self._index_file + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(self._index, f, indent=1, sort_keys=True)
+            os.replace(tmp, self._index_file)
+        return path
+
+    def fetch(self, url):
+        """ Bring url up to date in the cache, downloading it only if it
+        is new or has changed upstream. Returns the path of the cached
+        content and True if it was downloaded. """
+        staged = self.staging_path(url)
+        with self.lock(self._key(url)):
+            os.makedirs(os.path.dirname(staged), exist_ok=True)
+            with self._mutex, self.lock('index'):
+                self._read_index()
+            changed = download(url, staged, conditional=True)
+            path = self.lookup(url)
+            if changed or path is None:
+                path = self.store(url, staged)
+        return path, changed
+
+    def install(self, url, fileName, conditional=False):
+        """ Fetch url into the cache and place its content, and its .info
+        file, at fileName. Can be passed to download_all as its fetch
+        function. Returns True if fileName was updated; if conditional is
+        True, a fileName that already has the same content is left in
+        place (only its .info file is refreshed) and False is returned. """
+        path, changed = self.fetch(url)
+        staged = self.staging_path(url)
+        if conditional and os.path.exists(fileName) and \
+                read_info(fileName).get('URL') == url and \
+                (os.path.samefile(path, fileName) or
+                 file_digest(fileName) == os.path.basename(path)):
+            copy_info(staged, fileName)
+            return False
+        link_or_copy(path, fileName)
+        copy_info(staged, fileName)
+        return True
+
+    def fetch_all(self, urls, workers=8, per_host=2, verbose=False):
+        """ Make sure each of urls is in the cache, downloading only those
+        that are new or have changed upstream. Returns a dictionary of
+        url -> path of the cached content. A url that cannot be downloaded
+        is served from the cache if an earlier copy is available, and is
+        left out of the result otherwise. """
+        downloads = [(url, self.staging_path(url)) for url in urls]
+        updated, failures = download_all(
+            downloads, workers, per_host, verbose, conditional=True,
+            fetch=lambda url, fileName, conditional: self.fetch(url)[1])
+        failed = set()
+        for url, fileName, error in failures:
+            failed.add(url)
+            print('WARNING - unable to download {0}: {1}'.format(url, error))
+        paths = {}
+        for url in urls:
+            path = self.lookup(url)
+            if path is None:
+                continue
+            if url in failed:
+                print('WARNING - using cached copy of {0}'.format(url))
+            paths[url] = path
+        return paths
@@ -0,0 +1,152 @@
+# coding: utf-8
+
+'''
+ test_common.py
+
+ Tests of common.download against a local HTTP server whose responses
+ can be cut short or corrupted. Run from the top directory with
+ python -m unittest discover tests
+
+'''
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import gzip
+import http.client
+import os
+import random
+import tempfile
+import threading
+import unittest
+import urllib.error
+import common
+
+random.seed(0)
+GOOD = gzip.compress(bytes(random.getrandbits(8) for i in range(300000)))
+# a gzip header followed by garbage, caught by the verifier mid-stream
+CORRUPT = GOOD[:20] + b'\xff' * (len(GOOD) - 28) + GOOD[-8:]
+ETAG = '"v1"'
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    ''' Serves /g.gz as told by the server's modes, one per request:
+    'good', 'short' (the full Content-Length, but only the first 100000
+    bytes before the connection is closed), 'corrupt' or 'unavailable'
+    (503). Ranges are honoured for the good file. Any other path is not
+    found (404). '''
+
+    def do_GET(self):
+        self.server.requests.append(self.headers.get('Range'))
+        if self.path != '/g.gz':
+            self.send_error(404)
+            return
+        mode = self.server.modes.pop(0) if self.server.modes else 'good'
+        if mode == 'unavailable':
+            self.send_error(503)
+            return
+        body = CORRUPT if mode == 'corrupt' else GOOD
+        start = 0
+        if (self.headers.get('Range') and
+                self.headers.get('If-Range') == ETAG and mode == 'good'):
+            start = int(self.headers['Range'][len('bytes='):-1])
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {0}-{1}/{2}'.format(
+                start, len(body) - 1, len(body)))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body) - start))
+        self.send_header('ETag', ETAG)
+        self.send_header('Last-Modified', 'Mon, 01 Jan 2024 00:00:00 GMT')
+        self.end_headers()
+        if mode == 'short':
+            self.wfile.write(body[:100000])
+        else:
+            self.wfile.write(body[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+class DownloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.server.modes = []
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.url = 'http://127.0.0.1:{0}/g.gz'.format(
+            self.server.server_address[1])
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.retry_delay = common.retry_delay
+        common.retry_delay = 0
+
+    def tearDown(self):
+        common.retry_delay = self.retry_delay
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def read(self, fileName):
+        with open(fileName, 'rb') as f:
+            return f.read()
+
+    def test_no_file_name(self):
+        self.assertTrue(common.download(self.url))
+        self.assertEqual(self.read('g.gz'), GOOD)
+        self.assertEqual(common.read_info('g.gz')['URL'], self.url)
+
+    def test_short_body_is_resumed(self):
+        self.server.modes = ['short']
+        self.assertTrue(common.download(self.url, 'g.gz'))
+        self.assertEqual(self.read('g.gz'), GOOD)
+        self.assertEqual(self.server.requests, [None, 'bytes=100000-'])
+        self.assertFalse(os.path.exists('g.gz.part'))
+        self.assertFalse(os.path.exists('g.gz.part.info'))
+
+    def test_short_body_kept_for_next_run(self):
+        self.server.modes = ['short']
+        with self.assertRaises(http.client.IncompleteRead):
+            common.download(self.url, 'g.gz', attempts=1)
+        self.assertEqual(os.path.getsize('g.gz.part'), 100000)
+        self.assertTrue(common.download(self.url, 'g.gz'))
+        self.assertEqual(self.read('g.gz'), GOOD)
+        self.assertEqual(self.server.requests[-1], 'bytes=100000-')
+
+    def test_corrupt_download_is_discarded(self):
+        self.server.modes = ['corrupt']
+        with self.assertRaises(common.IntegrityError):
+            common.download(self.url, 'g.gz', attempts=1)
+        self.assertFalse(os.path.exists('g.gz.part'))
+        self.assertFalse(os.path.exists('g.gz.part.info'))
+        # the next run downloads the (now good) file from scratch
+        self.assertTrue(common.download(self.url, 'g.gz'))
+        self.assertEqual(self.read('g.gz'), GOOD)
+        self.assertEqual(self.server.requests[-1], None)
+
+    def test_corrupt_download_is_retried(self):
+        self.server.modes = ['corrupt']
+        self.assertTrue(common.download(self.url, 'g.gz'))
+        self.assertEqual(self.read('g.gz'), GOOD)
+        self.assertEqual(self.server.requests, [None, None])
+
+    def test_missing_file_is_not_retried(self):
+        with self.assertRaises(urllib.error.HTTPError) as cm:
+            common.download(self.url.replace('g.gz', 'missing.gz'),
+                            'missing.gz')
+        self.assertEqual(cm.exception.code, 404)
+        self.assertEqual(self.server.requests, [None])
+        self.assertFalse(os.path.exists('missing.gz'))
+
+    def test_server_error_is_retried(self):
+        self.server.modes = ['unavailable']
+        self.assertTrue(common.download(self.url, 'g.gz'))
+        self.assertEqual(self.read('g.gz'), GOOD)
+        self.assertEqual(self.server.requests, [None, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
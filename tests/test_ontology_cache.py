@@ -0,0 +1,89 @@
+# coding: utf-8
+
+'''
+ test_ontology_cache.py
+
+ Tests that truncated or corrupt ontology cache entries are parsed
+ again rather than failing the run.
+
+'''
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from ontology_cache import OntologyCache
+
+
+class OntologyCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp.name, 'test.owl')
+        with open(self.source, 'w') as f:
+            f.write('<rdf:RDF/>')
+        self.cache = OntologyCache(os.path.join(self.tmp.name, 'cache'))
+        self.records = [{'id': 'T:{0}'.format(i), 'name': 'term {0}'.format(i)}
+                        for i in range(2500)]
+        self.parsed = 0
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self):
+        self.parsed += 1
+        return {'terms': self.records}
+
+    def read(self):
+        self.parsed += 1
+        return iter(self.records)
+
+    def entry(self):
+        directory = os.path.join(self.cache.directory, 'test', 'test.owl')
+        names = os.listdir(directory)
+        self.assertEqual(len(names), 1)
+        return os.path.join(directory, names[0])
+
+    def truncate(self, path):
+        size = os.path.getsize(path)
+        with open(path, 'r+b') as f:
+            f.truncate(size // 2)
+
+    def get(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.cache.get('test', 1, self.source, self.build)
+
+    def stream(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return list(self.cache.stream('test', 1, self.source, self.read))
+
+    def test_get_truncated(self):
+        self.assertEqual(self.get(), {'terms': self.records})
+        self.truncate(self.entry())
+        self.assertEqual(self.get(), {'terms': self.records})
+        self.assertEqual(self.parsed, 2)
+        # the entry was stored again
+        self.assertEqual(self.get(), {'terms': self.records})
+        self.assertEqual(self.parsed, 2)
+
+    def test_stream_truncated(self):
+        self.assertEqual(self.stream(), self.records)
+        self.truncate(self.entry())
+        # the records before the damage come from the cache, the rest
+        # from parsing again, each once
+        self.assertEqual(self.stream(), self.records)
+        self.assertEqual(self.parsed, 2)
+        self.assertEqual(self.stream(), self.records)
+        self.assertEqual(self.parsed, 2)
+
+    def test_stream_corrupt(self):
+        self.assertEqual(self.stream(), self.records)
+        with open(self.entry(), 'wb') as f:
+            f.write(b'not a pickle')
+        self.assertEqual(self.stream(), self.records)
+        self.assertEqual(self.parsed, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# coding: utf-8
+
+'''
+ test_parsers.py
+
+ Tests that OwlParser reads the same classes from an RDF/XML file by
+ streaming it as from an rdflib Graph of it.
+
+'''
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from rdflib import Graph
+from parsers import OwlParser
+
+EFO = '''<?xml version="1.0"?>
+<rdf:RDF xmlns="http://www.ebi.ac.uk/efo/efo.owl#"
+     xml:base="http://www.ebi.ac.uk/efo/efo.owl"
+     xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+     xmlns:rdfs="http://www.w3.org/2000/01/rdf-schema#"
+     xmlns:owl="http://www.w3.org/2002/07/owl#"
+     xmlns:oboInOwl="http://www.geneontology.org/formats/oboInOwl#">
+    <owl:Ontology rdf:about="http://www.ebi.ac.uk/efo/efo.owl">
+        <owl:versionInfo>2.0</owl:versionInfo>
+    </owl:Ontology>
+    <owl:AnnotationProperty rdf:about="http://www.ebi.ac.uk/efo/definition"/>
+    <owl:Class rdf:about="http://www.ebi.ac.uk/efo/EFO_0000322">
+        <rdfs:label>cell line</rdfs:label>
+    </owl:Class>
+    <owl:Class rdf:about="http://www.ebi.ac.uk/efo/EFO_0001">
+        <rdfs:label>cancer cell line</rdfs:label>
+        <rdfs:subClassOf rdf:resource="http://www.ebi.ac.uk/efo/EFO_0000322"/>
+    </owl:Class>
+    <rdf:Description rdf:about="http://www.ebi.ac.uk/efo/EFO_0003">
+        <rdf:type rdf:resource="http://www.w3.org/2002/07/owl#Class"/>
+        <rdfs:label>HeLa</rdfs:label>
+        <rdfs:subClassOf rdf:resource="http://www.ebi.ac.uk/efo/EFO_0001"/>
+        <oboInOwl:hasDbXref>CLO:0003684</oboInOwl:hasDbXref>
+        <oboInOwl:hasExactSynonym>HeLa cell</oboInOwl:hasExactSynonym>
+        <owl:deprecated rdf:datatype="http://www.w3.org/2001/XMLSchema#boolean">false</owl:deprecated>
+    </rdf:Description>
+    <owl:Class rdf:about="http://www.ebi.ac.uk/efo/EFO_0004"/>
+    <rdf:Description rdf:about="http://www.ebi.ac.uk/efo/EFO_0004">
+        <rdfs:label>disease</rdfs:label>
+        <owl:deprecated rdf:datatype="http://www.w3.org/2001/XMLSchema#boolean">true</owl:deprecated>
+    </rdf:Description>
+</rdf:RDF>
+'''
+
+
+class OwlParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        # the hierarchy index is saved in the working directory
+        os.chdir(self.tmp.name)
+        with open('efo.owl', 'w') as f:
+            f.write(EFO)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def parse(self, fileName):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return dict((term['id'], term) for term in
+                        OwlParser(os.path.abspath(fileName)).parse())
+
+    def test_stream_matches_graph(self):
+        parser = OwlParser(os.path.abspath('efo.owl'))
+        terms, edges, header = parser.stream_classes()
+        graph_terms, graph_edges, graph_header = parser.graph_classes()
+        self.assertEqual(terms, graph_terms)
+        self.assertEqual(sorted(edges), sorted(graph_edges))
+        self.assertEqual(header, graph_header)
+        self.assertIn('http://www.ebi.ac.uk/efo/EFO_0003', terms)
+
+    def test_typed_description_is_a_class(self):
+        terms = self.parse('efo.owl')
+        self.assertEqual(sorted(terms), ['EFO_0000322', 'EFO_0001',
+                                         'EFO_0003', 'EFO_0004'])
+        self.assertEqual(terms['EFO_0003']['name'], 'HeLa')
+        self.assertEqual(terms['EFO_0003']['synonyms'], {'HeLa cell'})
+        self.assertIs(terms['EFO_0003']['is_obsolete'], False)
+        self.assertEqual(terms['EFO_0003']['term_type'], {'CellLine'})
+        self.assertEqual(terms['EFO_0001']['term_type'], {'CellLine'})
+        # described twice, and merged
+        self.assertEqual(terms['EFO_0004']['name'], 'disease')
+        self.assertIs(terms['EFO_0004']['is_obsolete'], True)
+
+    def test_graph_fallback(self):
+        # not RDF/XML, so read into an rdflib Graph
+        owl = Graph()
+        owl.parse('efo.owl', format='xml')
+        owl.serialize('efo.ttl', format='turtle')
+        self.assertEqual(self.parse('efo.ttl'), self.parse('efo.owl'))
+
+
+if __name__ == '__main__':
+    unittest.main()